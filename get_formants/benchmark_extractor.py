@@ -0,0 +1,263 @@
+# Bachelor Thesis – Computational Linguistics: A Large-Scale, Cross-Linguistic Investigation of Vowel Dispersion
+# University of Zurich
+# Spring Semester 2025
+# Description: Script to benchmark vxc_get_dur_f0_formants.py on synthetic recordings with known F0, F1 and F2
+# Note: The synthetic corpus needs no Common Voice data. The script reports the throughput and the time per stage, the error against
+# the ground truth, and (with --compare_with) whether another version of the extractor gives the same output.
+
+
+import os, sys, argparse, time, json, random, shlex, subprocess, importlib.util, wave
+import numpy as np
+import pandas as pd
+from praatio import textgrid
+
+sampling_frequency = 16000
+
+# Synthetic vowels with their F1 and F2 in Hz (F3 to F5 are fixed above them)
+synthetic_vowels = {'a': (750, 1250), 'i': (300, 2250), 'u': (330, 850), 'e': (450, 1900), 'o': (480, 900)}
+synthetic_consonants = ['p', 't', 'k', 's', 'm', 'n', 'l']
+# F0 of the synthetic speakers, on both sides of the 160 Hz boundary between the formant settings of the extractor
+synthetic_f0s = [100, 120, 140, 190, 220, 250]
+formant_bandwidths = [60, 90, 120, 150, 200]
+
+# Helper function to get the gain of a cascade of formant resonators at the given frequencies (1 at 0 Hz)
+def resonator_gain(freqs, formants):
+    gain = np.ones(len(freqs))
+    for formant, bandwidth in zip(formants, formant_bandwidths):
+        gain *= formant ** 2 / np.sqrt((formant ** 2 - freqs ** 2) ** 2 + (bandwidth * freqs) ** 2)
+    return gain
+
+# Helper function to synthesise a vowel as a sum of harmonics of f0, shaped by the formant resonances and a -6 dB/octave source
+def synthesise_vowel(n_samples, f0, f1, f2):
+    t = np.arange(n_samples) / sampling_frequency
+    harmonics = f0 * np.arange(1, int(0.45 * sampling_frequency / f0) + 1)
+    formants = [f1, f2, max(2600, f2 + 450), 3600, 4500]
+    amplitudes = resonator_gain(harmonics, formants) / np.arange(1, len(harmonics) + 1)
+    signal = amplitudes @ np.sin(2 * np.pi * np.outer(harmonics, t))
+
+    # Fade in and out over 5 ms to avoid clicks at the segment boundaries
+    ramp = np.minimum(1, np.minimum(np.arange(n_samples), np.arange(n_samples)[::-1]) / (0.005 * sampling_frequency))
+    return 0.3 * ramp * signal / np.abs(signal).max()
+
+# Helper function to write a mono 16-bit WAV file
+def write_wav(path, samples):
+    data = (np.clip(samples, -1, 1) * 32767).astype('<i2')
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sampling_frequency)
+        f.writeframes(data.tobytes())
+
+# Helper function to generate a synthetic {lang_code}_v{ver_num} corpus in the layout of the CommonVoice directory
+# The sounds are WAV files under the .mp3 names that the extractor looks for (Praat recognises the format from the content)
+# Returns the ground truth (F0, F1 and F2 of every vowel, by file_id and seg_intv), which is also saved as ground_truth.csv
+def generate_corpus(commonvoice_dir, lang_code, ver_num, n_files, seed=0):
+    rng = random.Random(seed)
+    noise = np.random.default_rng(seed)
+    lang_dir = os.path.join(commonvoice_dir, f'{lang_code}_v{ver_num}')
+    os.makedirs(os.path.join(lang_dir, 'output'), exist_ok=True)
+    os.makedirs(os.path.join(lang_dir, 'validated'), exist_ok=True)
+
+    truth = []
+    for k in range(n_files):
+        file_id = f'common_voice_{lang_code}_{k:08d}'
+        f0 = rng.choice(synthetic_f0s)
+
+        # Words of one to four segments between a leading and a trailing pause, the vowels 60 to 180 ms long
+        time_point = 0.3
+        seg_entries = [(0.0, 0.3, '')]
+        word_entries = []
+        for _ in range(rng.randint(5, 9)):
+            word_start = time_point
+            for _ in range(rng.randint(1, 4)):
+                if rng.random() < 0.5:
+                    label = rng.choice(list(synthetic_vowels)) + rng.choice(['', 'ː'])
+                    seg_dur = rng.uniform(0.06, 0.18)
+                else:
+                    label = rng.choice(synthetic_consonants)
+                    seg_dur = rng.uniform(0.04, 0.08)
+                seg_entries.append((time_point, round(time_point + seg_dur, 3), label))
+                time_point = round(time_point + seg_dur, 3)
+            word_entries.append((word_start, time_point, ''.join(label for start, _, label in seg_entries if start >= word_start)))
+        end = round(time_point + 0.4, 3)
+        seg_entries.append((time_point, end, ''))
+
+        # Consonants are noise, pauses very soft noise
+        samples = noise.normal(0, 0.001, int(end * sampling_frequency))
+        for i, (start, stop, label) in enumerate(seg_entries):
+            lo, hi = int(start * sampling_frequency), int(stop * sampling_frequency)
+            vowel = label.rstrip('ː')
+            if vowel in synthetic_vowels:
+                f1, f2 = synthetic_vowels[vowel]
+                samples[lo:hi] += synthesise_vowel(hi - lo, f0, f1, f2)
+                truth.append((file_id, i, label, f0, f1, f2))
+            elif label:
+                samples[lo:hi] += noise.normal(0, 0.02, hi - lo)
+
+        tg = textgrid.Textgrid()
+        tg.addTier(textgrid.IntervalTier('words', word_entries, 0, end))
+        tg.addTier(textgrid.IntervalTier('phones', [entry for entry in seg_entries if entry[2]], 0, end))
+        tg.save(os.path.join(lang_dir, 'output', file_id + '.TextGrid'), format='long_textgrid', includeBlankSpaces=True)
+        write_wav(os.path.join(lang_dir, 'validated', file_id + '.mp3'), samples)
+
+    truth = pd.DataFrame(truth, columns=['file_id', 'seg_intv', 'seg', 'F0_true', 'F1_true', 'F2_true'])
+    truth.to_csv(os.path.join(lang_dir, 'ground_truth.csv'), index=False)
+    return truth
+
+# Helper function to import a version of the extractor from its path
+def load_extractor(extractor_path, name='extractor'):
+    spec = importlib.util.spec_from_file_location(name, extractor_path)
+    extractor = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(extractor)
+    return extractor
+
+# Helper function to run process_textgrid_file on every TextGrid of a corpus in this process
+# Returns the number of rows, the runtime and the time per stage (if the extractor reports it)
+def run_in_process(extractor, commonvoice_dir, lang_code, ver_num):
+    lang_dir = os.path.join(commonvoice_dir, f'{lang_code}_v{ver_num}')
+    tg_dir, snd_dir = os.path.join(lang_dir, 'output'), os.path.join(lang_dir, 'validated')
+    tg_files = sorted(tg_file for tg_file in os.listdir(tg_dir) if tg_file.endswith('.TextGrid'))
+
+    n_rows = 0
+    stages = {}
+    start_time = time.perf_counter()
+    for tg_file in tg_files:
+        result = extractor.process_textgrid_file(lang_code, tg_file, tg_dir, snd_dir)
+        n_rows += len(result[0])
+        if len(result) > 3:
+            for stage, seconds in result[3].items():
+                stages[stage] = stages.get(stage, 0.0) + seconds
+    return n_rows, time.perf_counter() - start_time, stages
+
+# Helper function to run main of an extractor on a corpus as a separate process, the way it is run on the real data
+# Returns the output CSV and the runtime
+def run_main(extractor_path, commonvoice_dir, lang_code, ver_num, output_dir, extractor_args=()):
+    os.makedirs(output_dir, exist_ok=True)
+    start_time = time.perf_counter()
+    subprocess.run([sys.executable, extractor_path, commonvoice_dir, lang_code, ver_num, output_dir, *extractor_args],
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return os.path.join(output_dir, f'{lang_code}_v{ver_num}_dur_f0_formants.csv'), time.perf_counter() - start_time
+
+# Helper function to compare the output CSV with the ground truth
+# Returns the share of the vowels with a result and the mean, median and 95th percentile of the absolute error of F0, F1 and F2
+def measure_accuracy(output_csv, truth):
+    output = pd.read_csv(output_csv, keep_default_na=False, dtype={'file_id': str})
+    merged = output.merge(truth, on=['file_id', 'seg_intv'])
+    accuracy = {'coverage': round(len(merged) / len(truth), 4) if len(truth) else None}
+    for measure, column in [('F0', 'F0_mid10'), ('F1', 'F1'), ('F2', 'F2')]:
+        errors = (merged[column].astype(float) - merged[f'{measure}_true']).abs()
+        accuracy[measure] = {
+            'mean_abs_error': round(errors.mean(), 2),
+            'median_abs_error': round(errors.median(), 2),
+            'p95_abs_error': round(errors.quantile(0.95), 2),
+        }
+    return accuracy
+
+# Helper function to check whether two output CSVs hold the same rows (in any order)
+# Returns None if they are identical, otherwise a short description of the differences
+def compare_outputs(output_csv, other_csv):
+    with open(output_csv, encoding='utf-8') as f, open(other_csv, encoding='utf-8') as g:
+        lines, other_lines = f.read().splitlines(), g.read().splitlines()
+    if lines[:1] == other_lines[:1] and sorted(lines[1:]) == sorted(other_lines[1:]):
+        return None
+
+    output = pd.read_csv(output_csv, keep_default_na=False, dtype={'file_id': str})
+    other = pd.read_csv(other_csv, keep_default_na=False, dtype={'file_id': str})
+    merged = output.merge(other, on=['file_id', 'seg_intv'], how='outer', suffixes=('', '_other'), indicator=True)
+    differences = {'rows_only_here': int((merged['_merge'] == 'left_only').sum()),
+                   'rows_only_other': int((merged['_merge'] == 'right_only').sum())}
+    both = merged[merged['_merge'] == 'both']
+    for column in ['F0_mid10', 'F0_first10', 'F0_seg_mean', 'F1', 'F2']:
+        if column in output.columns and column in other.columns:
+            values = pd.to_numeric(both[column], errors='coerce')
+            other_values = pd.to_numeric(both[f'{column}_other'], errors='coerce')
+            differences[f'{column}_max_abs_diff'] = float((values - other_values).abs().max())
+    return differences
+
+def parse_args():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Benchmark the formant extractor on synthetic recordings with known F0, F1 and F2.")
+    parser.add_argument("work_dir", type=str, help="Directory for the synthetic corpora and the outputs")
+    parser.add_argument("--sizes", type=lambda text: [int(size) for size in text.split(',')], default=[20, 100, 500],
+                        help="Numbers of recordings of the synthetic corpora (default: 20,100,500)")
+    parser.add_argument("--extractor", type=str, default=os.path.join(script_dir, 'vxc_get_dur_f0_formants.py'),
+                        help="Path of the extractor to benchmark (default: vxc_get_dur_f0_formants.py next to this script)")
+    parser.add_argument("--compare_with", type=str, default=None,
+                        help="Path of another version of the extractor (e.g. a checkout of an earlier commit) to benchmark on the same "
+                             "corpora and to check for the same output")
+    parser.add_argument("--extractor_args", type=shlex.split, default=[],
+                        help="Extra command-line options for the runs of main, e.g. \"--batch_size 10\"")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic corpora (default: 0)")
+    parser.add_argument("--max_f0_error", type=float, default=2.0, help="Largest accepted mean absolute F0 error in Hz (default: 2)")
+    parser.add_argument("--max_f1_error", type=float, default=30.0, help="Largest accepted mean absolute F1 error in Hz (default: 30)")
+    parser.add_argument("--max_f2_error", type=float, default=30.0, help="Largest accepted mean absolute F2 error in Hz (default: 30)")
+    parser.add_argument("--report", type=str, default=None, help="Path of a JSON file for the full results")
+    return parser.parse_args()
+
+def main(work_dir, sizes, extractor_path, compare_with=None, extractor_args=(), seed=0, max_errors=None, report=None):
+    lang_code, ver_num = 'xx', '1'
+    extractors = {'extractor': extractor_path}
+    if compare_with:
+        extractors['compare_with'] = compare_with
+    modules = {name: load_extractor(path, f'benchmark_{name}') for name, path in extractors.items()}
+
+    results = []
+    passed = True
+    for size in sizes:
+        commonvoice_dir = os.path.join(work_dir, f'corpus_{size}_seed{seed}')
+        print(f"Generating {size} synthetic recordings in {commonvoice_dir}")
+        truth = generate_corpus(commonvoice_dir, lang_code, ver_num, size, seed)
+
+        result = {'size': size, 'vowels': len(truth)}
+        for name, path in extractors.items():
+            n_rows, in_process_time, stages = run_in_process(modules[name], commonvoice_dir, lang_code, ver_num)
+            output_csv, main_time = run_main(path, commonvoice_dir, lang_code, ver_num, os.path.join(work_dir, f'output_{size}_{name}'),
+                                             extractor_args)
+            result[name] = {
+                'rows': n_rows,
+                'in_process_files_per_s': round(size / in_process_time, 2),
+                'main_files_per_s': round(size / main_time, 2),
+                'main_runtime_s': round(main_time, 3),
+                'stages_s': {stage: round(seconds, 3) for stage, seconds in stages.items()},
+                'accuracy': measure_accuracy(output_csv, truth),
+                'output_csv': output_csv,
+            }
+            print(f"  {name}: {n_rows} rows, {result[name]['in_process_files_per_s']} files/s in process, "
+                  f"{result[name]['main_files_per_s']} files/s with main ({main_time:.2f} s)")
+            if stages:
+                print("    stages: " + ", ".join(f"{stage} {seconds:.3f} s" for stage, seconds in stages.items()))
+            accuracy = result[name]['accuracy']
+            print(f"    coverage {accuracy['coverage']}, mean absolute error F0 {accuracy['F0']['mean_abs_error']} Hz, "
+                  f"F1 {accuracy['F1']['mean_abs_error']} Hz, F2 {accuracy['F2']['mean_abs_error']} Hz")
+
+            for measure in ['F0', 'F1', 'F2']:
+                if max_errors and accuracy[measure]['mean_abs_error'] > max_errors[measure]:
+                    print(f"    {measure} error above {max_errors[measure]} Hz")
+                    passed = False
+
+        # Numerical-equivalence check against the other version of the extractor
+        if compare_with:
+            differences = compare_outputs(result['extractor']['output_csv'], result['compare_with']['output_csv'])
+            result['identical_output'] = differences is None
+            result['differences'] = differences
+            print("  outputs identical" if differences is None else f"  outputs differ: {differences}")
+            if differences is not None:
+                passed = False
+            speedup = result['extractor']['main_files_per_s'] / result['compare_with']['main_files_per_s']
+            print(f"  speedup of main: {speedup:.2f}x")
+        results.append(result)
+
+    if report:
+        with open(report, 'w', encoding='utf-8') as f:
+            json.dump({'extractors': extractors, 'extractor_args': list(extractor_args), 'seed': seed, 'results': results}, f, indent=2)
+        print(f"Report saved to {report}")
+
+    print("Benchmark passed" if passed else "Benchmark failed")
+    return passed
+
+if __name__ == "__main__":
+    args = parse_args()
+    passed = main(args.work_dir, args.sizes, args.extractor, compare_with=args.compare_with, extractor_args=args.extractor_args,
+                  seed=args.seed, max_errors={'F0': args.max_f0_error, 'F1': args.max_f1_error, 'F2': args.max_f2_error},
+                  report=args.report)
+    sys.exit(0 if passed else 1)
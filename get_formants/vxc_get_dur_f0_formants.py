@@ -8,11 +8,16 @@
 
 import pandas as pd
 pd.options.mode.copy_on_write = True
-import os, logging, argparse, time, re
+import os, sys, logging, argparse, time, re, tempfile, hashlib, json, math, random, shutil, socket, signal, threading, multiprocessing
 from praatio import textgrid
 import parselmouth as psm
 import numpy as np
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from pandas.api.types import union_categoricals
+from collections import namedtuple
+from functools import lru_cache
+from itertools import repeat, zip_longest
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
@@ -27,124 +32,697 @@ target_vowels = [
     'a', 'ɶ', 'ɑ', 'ɒ', 'æ', 'ɐ', # Low vowels
 ]
 
-# Helper function to check if a label contains any IPA vowel symbol
-def contains_vowel(label):
-    return any(vowel in label for vowel in target_vowels)
+# Precompiled patterns for the label checks (longest symbols first so that e.g. 'ɹ̩' is matched as a whole)
+vowel_pattern = re.compile('|'.join(re.escape(vowel) for vowel in sorted(target_vowels, key=len, reverse=True)))
+tone_pattern = re.compile(r"[˥˦˧˨˩0-9]")
 
 # Define a function to identify monophthongs
-def is_monophthong(label):
+def check_monophthong(label):
     # Remove stress markers at the beginning if they exist
     if label.startswith("'") or label.startswith("ˈ｜ˌ"):
         label = label[1:]  # Remove the stress marker for further checks
 
     # Strip away IPA tone labels or any Arabic numbers
-    label = re.sub(r"[˥˦˧˨˩0-9]", "", label)
+    label = tone_pattern.sub("", label)
 
     # Check if it's a monophthong without stress or with the long vowel marker
     true_mono = len(label) == 1 or (len(label) == 2 and (label[1] == 'ː' or label[1] == ':'))
     return true_mono
 
+# Classification of a segment label
+LabelInfo = namedtuple('LabelInfo', ['is_vowel', 'is_monophthong', 'base_vowel'])
+
+# Helper function to classify a segment label
+# Labels repeat millions of times in a language, so each distinct label is only classified once per process
+@lru_cache(maxsize=None)
+def classify_label(label):
+    vowel_match = vowel_pattern.search(label)
+    base_vowel = vowel_match.group() if vowel_match else None
+    return LabelInfo(base_vowel is not None, check_monophthong(label), base_vowel)
+
+# Helper function to check if a label contains any IPA vowel symbol
+def contains_vowel(label):
+    return classify_label(label).is_vowel
+
+# Helper function to check if a label is a monophthong
+def is_monophthong(label):
+    return classify_label(label).is_monophthong
+
+# Interval tier as arrays: float64 start and stop times and (interned) labels
+Tier = namedtuple('Tier', ['starts', 'stops', 'labels'])
+
+# Patterns of the long ("normal") TextGrid format
+long_tier_split_pattern = re.compile(r'^[ \t]*item ?\[\d+\]:[ \t]*$', re.M)
+long_name_pattern = re.compile(r'^[ \t]*name = "(.*)"[ \t]*$', re.M)
+long_size_pattern = re.compile(r'^[ \t]*intervals: size = (\d+)[ \t]*$', re.M)
+long_interval_pattern = re.compile(r'^[ \t]*xmin = ([\d.]+)[ \t]*\n[ \t]*xmax = ([\d.]+)[ \t]*\n[ \t]*text = "(.*)"[ \t]*$', re.M)
+
+# Helper function to turn parsed intervals into a Tier, checking that they are ordered and do not overlap
+def make_tier(starts, stops, labels):
+    starts = np.array(starts, dtype=float)
+    stops = np.array(stops, dtype=float)
+    if np.any(starts >= stops) or np.any(stops[:-1] > starts[1:]):
+        raise ValueError("intervals are not in order")
+    return Tier(starts, stops, [sys.intern(label.strip().replace('""', '"')) for label in labels])
+
+# Helper function to read the first two (interval) tiers of a long TextGrid
+def parse_long_textgrid(data):
+    tiers = []
+    for block in long_tier_split_pattern.split(data)[1:3]:
+        if 'class = "IntervalTier"' not in block:
+            raise ValueError("not an interval tier")
+        intervals = long_interval_pattern.findall(block)
+        if len(intervals) != int(long_size_pattern.search(block).group(1)):
+            raise ValueError("unexpected interval layout")
+        starts, stops, labels = zip(*intervals) if intervals else ((), (), ())
+        tiers.append((long_name_pattern.search(block).group(1), make_tier(starts, stops, labels)))
+    return tiers
+
+# Helper function to read the first two (interval) tiers of a short TextGrid
+def parse_short_textgrid(data):
+    lines = [line.strip() for line in data.split('\n')]
+    tier_lines = [i for i, line in enumerate(lines) if line in ('"IntervalTier"', '"TextTier"')]
+    tiers = []
+    for i in tier_lines[:2]:
+        if lines[i] != '"IntervalTier"':
+            raise ValueError("not an interval tier")
+        n_intervals = int(lines[i + 4])
+        starts = lines[i + 5:i + 5 + 3 * n_intervals:3]
+        stops = lines[i + 6:i + 6 + 3 * n_intervals:3]
+        labels = lines[i + 7:i + 7 + 3 * n_intervals:3]
+        if len(labels) != n_intervals or not all(len(label) >= 2 and label[0] == '"' and label[-1] == '"' for label in labels):
+            raise ValueError("unexpected interval layout")
+        tiers.append((lines[i + 1][1:-1], make_tier(starts, stops, [label[1:-1] for label in labels])))
+    return tiers
+
+# Helper function to read the word tier (first tier) and segment tier (second tier) of a TextGrid
+# The two-tier aligner output is parsed directly; anything unusual is left to praatio
+def read_textgrid(tg_path):
+    try:
+        with open(tg_path, 'rb') as f:
+            raw = f.read()
+        data = raw.decode('utf-16' if raw.startswith((b'\xff\xfe', b'\xfe\xff')) else 'utf-8').replace('\r\n', '\n')
+        if "ooTextFile short" in data or "item [" not in data:
+            tiers = parse_short_textgrid(data)
+        else:
+            tiers = parse_long_textgrid(data)
+        if len(tiers) == 2 and tiers[0][0] != tiers[1][0]:
+            return tiers[0][1], tiers[1][1]
+    except (ValueError, IndexError, AttributeError):
+        pass
+
+    tg = textgrid.openTextgrid(tg_path, includeEmptyIntervals=True)
+    tiers = []
+    for tier_name in tg.tierNames[:2]:
+        entries = tg.getTier(tier_name).entries
+        tiers.append(Tier(np.array([entry[0] for entry in entries], dtype=float), np.array([entry[1] for entry in entries], dtype=float),
+                          [sys.intern(entry[2]) for entry in entries]))
+    return tiers[0], tiers[1]
+
+# Settings of the decoded-audio cache in this process (set by init_worker, None if the cache is not used)
+audio_cache = None
+
+# Helper function to get a short fingerprint of a source file's content
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.blake2b(f.read(), digest_size=8).hexdigest()
+
+# Helper function to read a sound file, through the decoded-audio cache if it is enabled
+# A cache entry is a flat float64 .npy array [sampling frequency, number of channels, samples...], keyed by file_id and
+# the hash of the mp3, and is memory-mapped when it is read back; its modification time is the last use for the LRU eviction
+def load_sound(snd_file, file_id):
+    if audio_cache is None:
+        return psm.Sound(snd_file)
+
+    cache_path = os.path.join(audio_cache['dir'], f'{file_id}.{file_digest(snd_file)}.npy')
+    try:
+        entry = np.load(cache_path, mmap_mode='r')
+        os.utime(cache_path)
+        n_channels = int(entry[1])
+        return psm.Sound(entry[2:].reshape(n_channels, -1), sampling_frequency=entry[0])
+    except (FileNotFoundError, ValueError):
+        pass
+
+    snd = psm.Sound(snd_file)
+    entry = np.concatenate(([snd.sampling_frequency, snd.n_channels], snd.values.ravel()))
+    tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, entry)
+    os.replace(tmp_path, cache_path)
+
+    # Keep the cache within its size budget (each process checks after writing 1% of the budget)
+    audio_cache['written'] += entry.nbytes
+    if audio_cache['written'] > audio_cache['budget'] * 0.01:
+        evict_audio_cache(audio_cache['dir'], audio_cache['budget'])
+        audio_cache['written'] = 0
+    return snd
+
+# Helper function to get the sound file and file ID of a TextGrid
+def sound_path(tg_file, snd_dir):
+    file_id, _ = os.path.splitext(os.path.basename(tg_file))
+    return os.path.join(snd_dir, file_id + '.mp3'), file_id
+
+# Store of the pitch and formant tracks of every recording (set per worker by init_worker), or None
+# Entries are compressed .npz files, spread over 256 subdirectories by file_id, and named after the file_id and a key of the source
+# files and the analysis parameters that decide which regions are analysed (see track_key); every entry holds the tracks of all
+# formant configurations computed so far for the recording
+track_store = None
+
+# Helper function to get the key of the stored tracks of a recording, from the hash of its mp3 and the analysis parameters
+# (in vowel-region mode also from the hash of the TextGrid, which the regions come from), so that a changed file is analysed again
+def track_key(snd_file, tg_path, vowel_regions_only, region_padding, segment_filter):
+    params = {'sound': file_digest(snd_file), 'pitch': [75.0, 500.0, 'auto'], 'regions': None}
+    if vowel_regions_only:
+        params['regions'] = [region_padding, segment_filter and dict(segment_filter, vowels=sorted(segment_filter['vowels'] or [])),
+                             file_digest(tg_path)]
+    return hashlib.blake2b(json.dumps(params, sort_keys=True).encode(), digest_size=8).hexdigest()
+
+# Helper function to get the path of a track store entry
+def track_path(file_id, key):
+    chunk = hashlib.blake2b(file_id.encode(), digest_size=1).hexdigest()
+    return os.path.join(track_store, chunk, f'{file_id}.{key}.npz')
+
+# Helper function to read the stored tracks of a recording
+# Returns a dict with the analysed regions, the pitch frame times and F0 values per region, and the formant parts (see
+# analyse_formants) of every stored configuration, or None if the recording has no entry
+def load_tracks(file_id, key):
+    try:
+        with np.load(track_path(file_id, key)) as entry:
+            entry = dict(entry)
+    except (FileNotFoundError, ValueError, OSError):
+        return None
+    split = np.cumsum(entry['part_frames'])[:-1]
+    tracks = {
+        'regions': [None if np.isnan(start) else [start, stop] for start, stop in entry['regions'].tolist()],
+        'times': np.split(entry['times'], split),
+        'f0s': np.split(entry['f0s'], split),
+        'formants': {},
+    }
+    for k, config in enumerate(entry['configs'].tolist()):
+        tracks['formants'][(config[0], int(config[1]), config[2])] = unpack_parts(entry[f'grid_{k}'], entry[f'formant_frames_{k}'],
+                                                                                  entry[f'values_{k}'])
+    # (entries written before intensity was stored have none)
+    tracks['intensity'] = None
+    if 'intensity_values' in entry:
+        tracks['intensity'] = unpack_parts(entry['intensity_grid'], entry['intensity_frames'], entry['intensity_values'])
+    return tracks
+
+# Helper function to turn the parts of an analysis (see analyse_formants) back into a list, from their frame grids, their numbers of
+# frames and their concatenated values
+def unpack_parts(grids, part_frames, values):
+    values = np.split(values, np.cumsum(part_frames)[:-1], axis=1)
+    return [None if np.isnan(grid[0]) else (part_values, *grid) for part_values, grid in zip(values, grids.tolist())]
+
+# Helper function to turn the parts of an analysis into the arrays unpack_parts reads (n_rows is the number of rows of the values)
+def pack_parts(parts, n_rows):
+    grids = np.array([[np.nan] * 4 if part is None else part[1:] for part in parts], dtype=float).reshape(-1, 4)
+    part_frames = np.array([0 if part is None else part[0].shape[1] for part in parts], dtype=np.int64)
+    values = np.concatenate([part[0] for part in parts if part is not None] or [np.empty((n_rows, 0))], axis=1)
+    return grids, part_frames, values
+
+# Helper function to write the tracks of a recording to the store (in the form returned by load_tracks)
+# Missing formants and undefined values are stored as NaN, parts without formant frames as a row of NaN in the grid
+def save_tracks(file_id, key, tracks):
+    arrays = {
+        'regions': np.array([[np.nan, np.nan] if region is None else region for region in tracks['regions']], dtype=float).reshape(-1, 2),
+        'part_frames': np.array([len(times) for times in tracks['times']], dtype=np.int64),
+        'times': np.concatenate(tracks['times'] or [np.empty(0)]),
+        'f0s': np.concatenate(tracks['f0s'] or [np.empty(0)]),
+        'configs': np.array(list(tracks['formants']), dtype=float).reshape(-1, 3),
+    }
+    for k, formant_parts in enumerate(tracks['formants'].values()):
+        arrays[f'grid_{k}'], arrays[f'formant_frames_{k}'], arrays[f'values_{k}'] = pack_parts(formant_parts, 10)
+    if tracks.get('intensity') is not None:
+        arrays['intensity_grid'], arrays['intensity_frames'], arrays['intensity_values'] = pack_parts(tracks['intensity'], 1)
+
+    path = track_path(file_id, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez_compressed(f, **arrays)
+    os.replace(tmp_path, path)
+
+# Helper function to delete the least recently used cache entries until the cache is below 90% of its size budget
+def evict_audio_cache(cache_dir, budget):
+    entries = []
+    total_size = 0
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith('.npy'):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError: # evicted by another process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total_size += stat.st_size
+    if total_size <= budget:
+        return
+
+    for _, size, path in sorted(entries):
+        if total_size <= budget * 0.9:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total_size -= size
+
+# Helper function to turn a Formant object into a (number of formants x number of frames) frequency matrix
+def formant_matrix(formants, n_formants=2):
+    track = np.vstack([psm.praat.call(formants, "To Matrix...", n).values[0] for n in range(1, n_formants + 1)])
+    # Formants that are missing in a frame are stored as 0 Hz
+    track[track <= 0] = np.nan
+    return track
+
+# Helper function to turn a Formant object into a matrix of the frequencies (F1-F5) and bandwidths (B1-B5) of every frame
+# The bandwidths are read at the frame times, which gives the values of the frames themselves
+def formant_values(formants):
+    bandwidths = np.array([[formants.get_bandwidth_at_time(n, t) for t in formants.xs()] for n in range(1, 6)])
+    return np.vstack([formant_matrix(formants, 5), bandwidths.reshape(5, -1)])
+
+# Helper function to sample a formant matrix at many time points at once
+# It reproduces the linear interpolation of Formant.get_value_at_time (Praat's Sampled_getValueAtX)
+def sample_formant_matrix(track, x1, dx, xmin, xmax, query_times):
+    n_frames = track.shape[1]
+    query_times = np.asarray(query_times, dtype=float)
+    ireal = (query_times - x1) / dx + 1.0 # 1-based frame index, as in Praat
+    ileft = np.floor(ireal).astype(np.int64)
+    phase = ireal - ileft
+    left_is_near = phase < 0.5
+    inear = np.where(left_is_near, ileft, ileft + 1) - 1 # back to 0-based
+    ifar = np.where(left_is_near, ileft + 1, ileft) - 1
+    phase = np.where(left_is_near, phase, 1.0 - phase)
+
+    near_ok = (inear >= 0) & (inear < n_frames) & (query_times >= xmin) & (query_times <= xmax)
+    far_ok = (ifar >= 0) & (ifar < n_frames)
+    fnear = track[:, np.clip(inear, 0, n_frames - 1)]
+    ffar = track[:, np.clip(ifar, 0, n_frames - 1)]
+    fnear[:, ~near_ok] = np.nan
+
+    # Interpolate between the two closest frames, or extrapolate from the nearest one at the edges
+    use_far = far_ok & ~np.isnan(ffar)
+    return np.where(use_far, fnear + phase * (ffar - fnear), fnear)
+
+# Helper function to sample the formant tracks of the analysed parts of a recording at the given times (NaN outside of all parts)
+# Every part is a (track, x1, dx, xmin, xmax) tuple as used by sample_formant_matrix
+def sample_formant_parts(parts, query_times):
+    values = np.full((2, len(query_times)), np.nan)
+    assigned = np.zeros(len(query_times), dtype=bool)
+    for track, x1, dx, xmin, xmax in parts:
+        inside = ~assigned & (query_times >= xmin) & (query_times <= xmax)
+        values[:, inside] = sample_formant_matrix(track, x1, dx, xmin, xmax, query_times[inside])
+        assigned |= inside
+    return values
+
+# Helper function to get the first and one-past-last index of the (sorted) frame times inside [lo, hi] for many windows
+def window_bounds(times, lo, hi):
+    return np.searchsorted(times, lo, side='left'), np.searchsorted(times, hi, side='right')
+
+# Helper function to check if a segment is a vowel that can yield a result (a monophthong of at least 30 ms)
+# A segment filter ({'vowels': set of labels or None, 'min_seg_dur': ms, 'min_utt_dur': ms}) can restrict this further
+def is_eligible_vowel(start, stop, label, segment_filter=None):
+    label_info = classify_label(label)
+    if not (label and label_info.is_vowel and label_info.is_monophthong and round((stop - start) * 1000) >= 30):
+        return False
+    if segment_filter:
+        if segment_filter['vowels'] is not None and label not in segment_filter['vowels']:
+            return False
+        if round((stop - start) * 1000) < segment_filter['min_seg_dur']:
+            return False
+    return True
+
+# Helper function to get the regions around the eligible vowels, padded on both sides and merged where they overlap
+def vowel_regions(seg_entries, padding, xmin=-np.inf, xmax=np.inf, segment_filter=None):
+    regions = []
+    for start, stop, label in seg_entries:
+        if is_eligible_vowel(start, stop, label, segment_filter):
+            region_start, region_stop = max(xmin, start - padding), min(xmax, stop + padding)
+            if regions and region_start <= regions[-1][1]:
+                regions[-1][1] = max(regions[-1][1], region_stop)
+            else:
+                regions.append([region_start, region_stop])
+    return regions
+
+# Helper function to get the frame grid (time of the first frame, number of frames) of a Praat short-term analysis
+# with the given window duration and time step over a sound from xmin to xmax (as in Sampled_shortTermAnalysis)
+def analysis_grid(xmin, xmax, window, time_step):
+    duration = xmax - xmin
+    n_frames = math.floor((duration - window) / time_step) + 1
+    return xmin + 0.5 * duration - 0.5 * (n_frames - 1) * time_step, n_frames
+
+# Helper function to cut out the part of a sound to analyse for a region (None means the whole sound)
+# The part is chosen so that its analysis frames fall on the frames of the analysis of the whole sound
+def analysis_part(snd, region, window, time_step):
+    if region is None:
+        return snd
+    first_time, n_frames = analysis_grid(snd.xmin, snd.xmax, window, time_step)
+    first_frame = max(0, math.ceil((region[0] - first_time) / time_step))
+    last_frame = min(n_frames - 1, math.floor((region[1] - first_time) / time_step))
+    if last_frame < first_frame:
+        return None
+    centre = first_time + 0.5 * (first_frame + last_frame) * time_step
+    half_duration = 0.5 * (window + (last_frame - first_frame + 0.5) * time_step)
+    return snd.extract_part(from_time=max(snd.xmin, centre - half_duration), to_time=min(snd.xmax, centre + half_duration),
+                            preserve_times=True)
+
+# Helper function to compute the pitch of every analysed region of a recording (None for the whole sound)
+# Returns the regions with at least one pitch frame, and the frame times and F0 values of each of them
+def analyse_pitch(snd, regions):
+    pitch_parts = [(region, analysis_part(snd, region, 3.0 / 75.0, 0.75 / 75.0)) for region in regions]
+    pitch_parts = [(region, part) for region, part in pitch_parts if part is not None]
+    pitches = [part.to_pitch_ac(time_step=None, pitch_floor=75.0, pitch_ceiling=500.0) for _, part in pitch_parts]
+    return [region for region, _ in pitch_parts], [pitch.xs() for pitch in pitches], [pitch.selected_array["frequency"] for pitch in pitches]
+
+# Helper function to compute the formants of every analysed region of a recording with one configuration
+# Every part is (frequency matrix, x1, dx, xmin, xmax) as used by sample_formant_matrix, or None if no formant frame falls into the
+# region; with all_values, the matrix holds F1-F5 and B1-B5 (see formant_values), otherwise only F1 and F2
+def analyse_formants(snd, regions, config, all_values=False):
+    max_formant, n_formants, window_length = config
+    formant_parts = []
+    for region in regions:
+        part = analysis_part(snd, region, 2 * window_length, window_length / 4)
+        if part is None:
+            formant_parts.append(None)
+            continue
+        formants = part.to_formant_burg(time_step = None,
+                                        window_length = window_length,
+                                        maximum_formant = max_formant,
+                                        max_number_of_formants = n_formants)
+        values = formant_values(formants) if all_values else formant_matrix(formants)
+        formant_parts.append((values, formants.x1, formants.dx, formants.xmin, formants.xmax))
+    return formant_parts
+
+# Helper function to sample the F1 and F2 (or the given rows of the values) of the formant parts of a recording at the pitch frame
+# times of each part
+def sample_formant_tracks(formant_parts, part_times, rows=(0, 1)):
+    rows = list(rows)
+    tracks = [np.full((len(rows), len(query_times)), np.nan) if part is None else sample_formant_matrix(part[0][rows], *part[1:], query_times)
+              for part, query_times in zip(formant_parts, part_times)]
+    return np.concatenate(tracks or [np.empty((len(rows), 0))], axis=1)
+
+# Helper function to compute the intensity of every analysed region of a recording, with the pitch floor of the pitch analysis
+# Every part is (intensity matrix of one row, x1, dx, xmin, xmax) as in analyse_formants, or None if no frame falls into the region
+def analyse_intensity(snd, regions):
+    intensity_parts = []
+    for region in regions:
+        part = analysis_part(snd, region, 6.4 / 75.0, 0.8 / 75.0)
+        if part is None:
+            intensity_parts.append(None)
+            continue
+        intensity = part.to_intensity(minimum_pitch=75.0)
+        intensity_parts.append((intensity.values.copy(), intensity.x1, intensity.dx, intensity.xmin, intensity.xmax))
+    return intensity_parts
+
+# Helper function to get the rounded mean of the defined values in values[lo:hi] (NaN if there are none)
+def window_mean(values, lo, hi):
+    window = values[lo:hi]
+    window = window[~np.isnan(window)]
+    return np.nan if window.size == 0 else round(np.mean(window))
+
+# Helper function to get the means of the defined values of every row of a track matrix in many windows [lo, hi) at once
+# (NaN where a window has none), from the cumulative sums of the values
+def window_means(track, lo, hi):
+    defined = ~np.isnan(track)
+    sums = np.concatenate([np.zeros((len(track), 1)), np.cumsum(np.where(defined, track, 0.0), axis=1)], axis=1)
+    counts = np.concatenate([np.zeros((len(track), 1), dtype=np.int64), np.cumsum(defined, axis=1)], axis=1)
+    n = counts[:, hi] - counts[:, lo]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(n > 0, (sums[:, hi] - sums[:, lo]) / n, np.nan)
+
+# Helper function to parse formant configurations given as 'maximum_formant:number_of_formants:window_length,...'
+def parse_formant_configs(text):
+    configs = []
+    for config in text.split(','):
+        max_formant, n_formants, window_length = config.split(':')
+        configs.append((float(max_formant), int(n_formants), float(window_length)))
+    return configs
+
+# Helper function to get the name of a formant configuration, e.g. 5500_5_25ms
+def formant_config_name(config):
+    max_formant, n_formants, window_length = config
+    return f'{max_formant:g}_{n_formants}_{window_length * 1000:g}ms'
+
+# Helper function to get the output columns of a formant configuration, e.g. F1_5500_5_25ms and F2_5500_5_25ms
+def formant_config_columns(config):
+    name = formant_config_name(config)
+    return [f'F1_{name}', f'F2_{name}']
+
+# Relative positions of the points of the formant trajectories (the middle of each tenth of the vowel), and their output columns
+trajectory_points = (np.arange(10) + 0.5) / 10
+trajectory_columns = [f'F{n}_{round(point * 100):02d}' for n in (1, 2) for point in trajectory_points]
+
+# Output columns of the extra measures at the vowel midpoint, and the rows of formant_values they are taken from
+# (the intensity is in dB, the other measures in Hz)
+extra_measure_columns = ['F3', 'B1', 'B2', 'intensity']
+extra_formant_rows = (2, 5, 6)
+
+# Helper function to index the segment tier against the word tier in one pass
+# Both tiers are sorted and non-overlapping, so every lookup reduces to a searchsorted or a cumulative count
+def index_segment_context(seg_tier, word_tier):
+    n_segs = len(seg_tier.labels)
+    seg_starts, seg_stops = seg_tier.starts, seg_tier.stops
+    word_starts, word_stops = word_tier.starts, word_tier.stops
+    is_vowel = np.array([contains_vowel(label) for label in seg_tier.labels], dtype=bool)
+    seg_idx = np.arange(n_segs)
+
+    # Word containing each segment (-1 if the segment is not inside any word)
+    seg_word = np.searchsorted(word_stops, seg_stops, side='left')
+    in_word = seg_word < len(word_starts)
+    in_word[in_word] = word_starts[seg_word[in_word]] <= seg_starts[in_word]
+    seg_word[~in_word] = -1
+
+    # Closest vowel strictly before and strictly after each segment (-1 and n_segs if there is none)
+    prev_vowel = np.concatenate(([-1], np.maximum.accumulate(np.where(is_vowel, seg_idx, -1))[:-1]))
+    next_vowel = np.concatenate((np.minimum.accumulate(np.where(is_vowel, seg_idx, n_segs)[::-1])[::-1][1:], [n_segs]))
+
+    # Running count of consonants, so the consonants in any span of segments can be counted in constant time
+    cons_count = np.concatenate(([0], np.cumsum(~is_vowel)))
+
+    # Span of segments belonging to each word: first segment starting in it and one past the last segment ending in it
+    word_first_seg = np.searchsorted(seg_starts, word_starts, side='left')
+    word_end_seg = np.searchsorted(seg_stops, word_stops, side='right')
+
+    # First segment that starts strictly after each segment ends
+    next_after_stop = np.maximum(seg_idx + 1, np.searchsorted(seg_starts, seg_stops, side='right'))
+
+    return {
+        'seg_word': seg_word,
+        'prev_vowel': prev_vowel,
+        'next_vowel': next_vowel,
+        'cons_count': cons_count,
+        'word_first_seg': word_first_seg,
+        'word_end_seg': word_end_seg,
+        'next_after_stop': next_after_stop,
+    }
+
+# Names of the timed stages of process_textgrid_file
+timing_stages = ['textgrid', 'decode', 'pitch', 'formant', 'features']
+
+# Helper function to add the time since clock to a stage and restart the clock
+def lap(timings, stage, clock):
+    now = time.perf_counter()
+    timings[stage] += now - clock
+    return now
+
 # Helper function to process a single TextGrid file
-def process_textgrid_file(lang_code, tg_file, tg_dir, snd_dir):
+# Returns the result rows, the number of failed and processed vowel intervals and the time spent in each stage
+def process_textgrid_file(lang_code, tg_file, tg_dir, snd_dir, formant_configs=None, vowel_regions_only=False, region_padding=0.1,
+                          segment_filter=None, trajectories=False, speaker_config=None, extra_measures=False):
     results = []
     tg_path = os.path.join(tg_dir, tg_file)
-    tg_name = os.path.basename(tg_file)
-    file_id, _ = os.path.splitext(tg_name)
-    snd_name = file_id + '.mp3'
-    snd_file = os.path.join(snd_dir, snd_name)
+    snd_file, file_id = sound_path(tg_file, snd_dir)
+    mark_current_file(tg_path)
 
     failed_intervals = 0
     processed_intervals = 0
     total_duration = 0
     total_intervals = 0
     non_spn_intervals = []
+    timings = dict.fromkeys(timing_stages, 0.0)
 
     if not os.path.exists(snd_file):
         logging.warning(f"Sound file {snd_file} does not exist. Skipping.")
-        return results, failed_intervals, processed_intervals
+        return results, failed_intervals, processed_intervals, timings
 
     try:
-        tg = textgrid.openTextgrid(tg_path, includeEmptyIntervals=True)
-        word_tier = tg.getTier(tg.tierNames[0]) # Get the word tier
-        seg_tier = tg.getTier(tg.tierNames[1]) # Get the segment tier
+        clock = time.perf_counter()
+        word_tier, seg_tier = read_textgrid(tg_path) # Get the word tier and the segment tier
+        word_entries = list(zip(word_tier.starts.tolist(), word_tier.stops.tolist(), word_tier.labels))
+        seg_entries = list(zip(seg_tier.starts.tolist(), seg_tier.stops.tolist(), seg_tier.labels))
+        clock = lap(timings, 'textgrid', clock)
 
-        n_wd_intv = len(word_tier)
+        n_wd_intv = len(word_entries)
 
         # Skip any recordings that have only one or two words
         if n_wd_intv > 4:
 
             # Get the total duration and number of non-'spn' intervals
-            utterance_start = next(start for start, _, label in seg_tier.entries if label)
-            utterance_end = max(stop for _, stop, label in reversed(seg_tier.entries) if label)
+            utterance_start = next(start for start, _, label in seg_entries if label)
+            utterance_end = max(stop for _, stop, label in reversed(seg_entries) if label)
             utterance_duration = utterance_end - utterance_start
 
             # Get the total duration and number of non-'spn' intervals
-            for start, stop, label in seg_tier.entries:
+            for start, stop, label in seg_entries:
                 if label and label != 'spn':
                     intv_dur = stop - start
                     total_duration += intv_dur
                     total_intervals += 1
                     non_spn_intervals.append((start, stop, label))
+            clock = lap(timings, 'features', clock)
+
+            # With a segment filter, skip the recording without reading the sound if none of its vowels can pass it
+            if segment_filter and (round(total_duration * 1000) < segment_filter['min_utt_dur']
+                                   or not any(is_eligible_vowel(start, stop, label, segment_filter) for start, stop, label in seg_entries)):
+                return results, failed_intervals, processed_intervals, timings
 
             # Read the sound file
-            snd = psm.Sound(snd_file)
+            # In vowel-region mode, the sound is not even read if no vowel can yield a result
+            regions = [None] # the whole sound
+            if vowel_regions_only:
+                regions = vowel_regions(seg_entries, region_padding, segment_filter=segment_filter)
+            # With a track store, the stored tracks of the recording are used instead where they exist
+            snd = None
+            stored_tracks = None
+            if track_store is not None and regions:
+                key = track_key(snd_file, tg_path, vowel_regions_only, region_padding, segment_filter)
+                stored_tracks = load_tracks(file_id, key)
+            if regions and stored_tracks is None:
+                snd = load_sound(snd_file, file_id)
+            clock = lap(timings, 'decode', clock)
 
-            # Get the pitch object
-            pitch = snd.to_pitch_ac(time_step=None, pitch_floor=75.0, pitch_ceiling=500.0)
-            f0s = pitch.selected_array["frequency"]
-            times = pitch.xs()
+            # Get the pitch track
+            # In vowel-region mode, only analyse padded regions around the vowels that can yield a result
+            if stored_tracks is not None:
+                regions, part_times, part_f0s = stored_tracks['regions'], stored_tracks['times'], stored_tracks['f0s']
+            else:
+                if vowel_regions_only and regions:
+                    regions = vowel_regions(seg_entries, region_padding, snd.xmin, snd.xmax, segment_filter)
+                regions, part_times, part_f0s = analyse_pitch(snd, regions)
+            f0s = np.concatenate(part_f0s or [np.empty(0)])
+            times = np.concatenate(part_times or [np.empty(0)])
+            clock = lap(timings, 'pitch', clock)
 
             # Calculate the mean F0 of the entire recording
+            # (in vowel-region mode the mean over the vowel regions, which hold most of the voiced frames, is used as an estimate)
             valid_f0s = f0s[f0s > 0]
             mean_f0_recording = np.mean(valid_f0s) if valid_f0s.size > 0 else np.nan
 
             # Get the formant object
             if mean_f0_recording <= 160:
                 mean_pitch_range = 'low'
-                formants = snd.to_formant_burg(time_step = None, 
-                                            window_length = 0.04, 
-                                            maximum_formant = 4000,
-                                            max_number_of_formants = 4)
+                formant_config = (4000, 4, 0.04)
             else:
                 mean_pitch_range = 'high'
-                formants = snd.to_formant_burg(time_step = None, 
-                                            window_length = 0.025,
-                                            maximum_formant = 5500,
-                                            max_number_of_formants = 5)
-
-            for i in range(len(seg_tier.entries)):
-                start, stop, label = seg_tier.entries[i]
-                if contains_vowel(label) and is_monophthong(label) and label:
+                formant_config = (5500, 5, 0.025)
+            # A formant configuration chosen for the speaker replaces the choice by mean F0
+            if speaker_config is not None:
+                formant_config = speaker_config
+
+            # Sample F1 and F2 at every pitch frame once for the whole recording, for every formant configuration needed
+            # (the formant tracks of the chosen configuration are also kept as they are, for the trajectories)
+            # Configurations that are not in the track store yet are analysed and added to it
+            formant_tracks = {}
+            formant_parts = []
+            new_tracks = stored_tracks is None
+            for config in [formant_config] + list(formant_configs or []):
+                if config not in formant_tracks:
+                    if stored_tracks is not None and config in stored_tracks['formants']:
+                        parts = stored_tracks['formants'][config]
+                    else:
+                        if snd is None and regions:
+                            snd = load_sound(snd_file, file_id)
+                        parts = analyse_formants(snd, regions, config,
+                                                 all_values=track_store is not None or (extra_measures and config == formant_config))
+                        new_tracks = True
+                        if stored_tracks is not None:
+                            stored_tracks['formants'][config] = parts
+                    if trajectories and not formant_tracks:
+                        formant_parts = [(part[0][:2], *part[1:]) for part in parts if part is not None]
+                    formant_tracks[config] = parts
+
+            # For the extra measures, F3, B1 and B2 of the chosen configuration and the intensity are sampled at the pitch frames too
+            # (the intensity analysis is counted with the formants)
+            intensity_parts = None
+            if extra_measures:
+                if stored_tracks is not None and stored_tracks['intensity'] is not None:
+                    intensity_parts = stored_tracks['intensity']
+                else:
+                    if snd is None and regions:
+                        snd = load_sound(snd_file, file_id)
+                    intensity_parts = analyse_intensity(snd, regions)
+                    new_tracks = True
+                    if stored_tracks is not None:
+                        stored_tracks['intensity'] = intensity_parts
+                extra_tracks = np.vstack([sample_formant_tracks(formant_tracks[formant_config], part_times, extra_formant_rows),
+                                          sample_formant_tracks(intensity_parts, part_times, (0,))])
+            if track_store is not None and regions and new_tracks:
+                if stored_tracks is None:
+                    stored_tracks = {'regions': regions, 'times': part_times, 'f0s': part_f0s, 'formants': formant_tracks,
+                                     'intensity': intensity_parts}
+                save_tracks(file_id, key, stored_tracks)
+            formant_tracks = {config: sample_formant_tracks(parts, part_times) for config, parts in formant_tracks.items()}
+            f1s, f2s = formant_tracks[formant_config]
+            clock = lap(timings, 'formant', clock)
+
+            # Resolve the midpoint, whole-segment and first 10% windows of all segments in one batch
+            seg_starts, seg_stops = seg_tier.starts, seg_tier.stops
+            mid_lo, mid_hi = window_bounds(times, seg_starts + (seg_stops - seg_starts) * 0.45, seg_stops - (seg_stops - seg_starts) * 0.45)
+            seg_lo, seg_hi = window_bounds(times, seg_starts, seg_stops)
+            first_10_lo, first_10_hi = window_bounds(times, seg_starts, seg_starts + (seg_stops - seg_starts) * 0.1)
+
+            # Midpoint means of the extra measures of all segments in one batch
+            if extra_measures:
+                extra_values = window_means(extra_tracks, mid_lo, mid_hi)
+                extra_values = np.vstack([np.round(extra_values[:3]), np.round(extra_values[3:], 2)]).T.tolist()
+
+            # F1 and F2 at the trajectory points of all segments, sampled from the formant tracks in one batch
+            if trajectories:
+                trajectory_times = seg_starts[:, None] + (seg_stops - seg_starts)[:, None] * trajectory_points
+                trajectory_values = sample_formant_parts(formant_parts, trajectory_times.ravel())
+                trajectory_values = trajectory_values.reshape(2, len(seg_entries), len(trajectory_points)).tolist()
+
+            # Word membership and consonant/vowel context of every segment
+            context = index_segment_context(seg_tier, word_tier)
+            cons_count = context['cons_count']
+
+            for i in range(len(seg_entries)):
+                start, stop, label = seg_entries[i]
+                label_info = classify_label(label)
+                if label_info.is_vowel and label_info.is_monophthong and label:
+                    # Vowels that the segment filter excludes are not counted at all
+                    if segment_filter and not is_eligible_vowel(start, stop, label, segment_filter):
+                        continue
                     intv_dur = round((stop - start) * 1000)
                     if intv_dur >= 30:
 
-                        prev_label = seg_tier.entries[i - 1][2] if i > 0 else 'NA'
-                        next_label = seg_tier.entries[i + 1][2] if i < len(seg_tier.entries) - 1 else 'NA'
+                        prev_label = seg_entries[i - 1][2] if i > 0 else 'NA'
+                        next_label = seg_entries[i + 1][2] if i < len(seg_entries) - 1 else 'NA'
 
-                        word_info = None
-                        for word_idx, (word_start, word_stop, word_label) in enumerate(word_tier.entries):
-                            if word_start <= start and word_stop >= stop:
-                                word_info = (word_label, round((word_stop - word_start) * 1000), word_idx, word_start, word_stop)
-                                break
-            
-                        if not word_info:
+                        word_idx = context['seg_word'][i]
+                        if word_idx < 0:
                             logging.warning(f"No matching word found for segment {label} at interval {i}.")
                             continue
 
-                        word_label, word_dur, word_idx, word_start, word_stop = word_info
+                        word_start, word_stop, word_label = word_entries[word_idx]
+                        word_dur = round((word_stop - word_start) * 1000)
                         
                         # Determine the position within the utterance
                         start_percentage = round((start - utterance_start) / utterance_duration, 2)
 
+                        # Check whether there are other vowels before or after this one in the same word
+                        prev_vowel = context['prev_vowel'][i]
+                        next_vowel = context['next_vowel'][i]
+                        vowel_before = prev_vowel >= 0 and seg_starts[prev_vowel] >= word_start
+                        vowel_after = next_vowel < len(seg_entries) and seg_starts[next_vowel] <= word_stop
+
                         # Get the utterance position
                         utt_pos = ''
-                        if start == word_start or (i > 0 and not any(contains_vowel(seg_tier.entries[j][2]) for j in range(i) if seg_tier.entries[j][0] >= word_start)):
+                        if start == word_start or (i > 0 and not vowel_before):
                             if word_idx == 1: # the first word in an utterance
                                 utt_pos = 'utt-initial'
                             else:
                                 utt_pos = 'word-initial'
-                        if stop == word_stop or (i > 0 and not any(contains_vowel(seg_tier.entries[j][2]) for j in range(i+1, len(seg_tier.entries)) if seg_tier.entries[j][0] <= word_stop)):
-                            if word_idx == len(word_tier.entries) - 1:
+                        if stop == word_stop or (i > 0 and not vowel_after):
+                            if word_idx == len(word_entries) - 1:
                                 utt_pos = 'utt-final'
                             else:
                                 utt_pos = 'word-final'
@@ -152,118 +730,1437 @@ def process_textgrid_file(lang_code, tg_file, tg_dir, snd_dir):
                             utt_pos = 'word-medial'
                         
                         # Check if the vowel is preceded by any consonants in a word
-                        preceded_by_consonants = any(
-                            not contains_vowel(seg_tier.entries[j][2]) 
-                            for j in range(i) if seg_tier.entries[j][0] >= word_start and seg_tier.entries[j][1] <= start
-                            )
+                        preceded_by_consonants = bool(cons_count[i] - cons_count[context['word_first_seg'][word_idx]] > 0)
                         
                         # Check if the vowel is followed by any consonants in a word
-                        followed_by_consonants = any(
-                            not contains_vowel(seg_tier.entries[j][2])
-                            for j in range(i + 1, len(seg_tier.entries)) if seg_tier.entries[j][0] > stop and seg_tier.entries[j][1] <= word_stop
-                        )
-
-                        mid_start = start + (stop - start) * 0.45
-                        mid_stop = stop - (stop - start) * 0.45
-                        mid_indices = np.where(np.logical_and(times >= mid_start, times <= mid_stop))
-                        target_f0s = f0s[mid_indices]
+                        follow_start = context['next_after_stop'][i]
+                        follow_end = context['word_end_seg'][word_idx]
+                        followed_by_consonants = bool(follow_end > follow_start and cons_count[follow_end] - cons_count[follow_start] > 0)
+
+                        target_f0s = f0s[mid_lo[i]:mid_hi[i]]
                         valid_target_f0s = target_f0s[target_f0s > 0]
 
-                        f1_vals = []
-                        f2_vals = []
-                        for time in times[mid_indices]:
-                            f1_value = formants.get_value_at_time(1, time)
-                            f2_value = formants.get_value_at_time(2, time)
-                            if f1_value is not None and not np.isnan(f1_value):
-                                f1_vals.append(f1_value)
-                            if f2_value is not None and not np.isnan(f2_value):
-                                f2_vals.append(f2_value)
-                        
+                        f1_vals = f1s[mid_lo[i]:mid_hi[i]]
+                        f1_vals = f1_vals[~np.isnan(f1_vals)]
+                        f2_vals = f2s[mid_lo[i]:mid_hi[i]]
+                        f2_vals = f2_vals[~np.isnan(f2_vals)]
+
                         # Calculate mean F0 for the entire vowel segment
-                        segment_indices = np.where(np.logical_and(times >= start, times <= stop))
-                        segment_f0s = f0s[segment_indices]
+                        segment_f0s = f0s[seg_lo[i]:seg_hi[i]]
                         valid_segment_f0s = segment_f0s[segment_f0s > 0]
                         mean_segment_f0 = np.nan if valid_segment_f0s.size == 0 else round(np.mean(valid_segment_f0s))
 
                         # Calculate mean F0 for the first 10% of the vowel segment
-                        first_10_stop = start + (stop - start) * 0.1
-                        first_10_indices = np.where(np.logical_and(times >= start, times <= first_10_stop))
-                        first_10_f0s = f0s[first_10_indices]
+                        first_10_f0s = f0s[first_10_lo[i]:first_10_hi[i]]
                         valid_first_10_f0s = first_10_f0s[first_10_f0s > 0]
                         mean_first_10_f0 = np.nan if valid_first_10_f0s.size == 0 else round(np.mean(valid_first_10_f0s))
 
-                        if valid_target_f0s.size > 0 and f1_vals and f2_vals:
-                            mean_f0 = np.nan if valid_target_f0s.size == 0 else round(np.mean(valid_target_f0s))
-                            mean_f1 = np.nan if not f1_vals else round(np.nanmean(f1_vals))
-                            mean_f2 = np.nan if not f2_vals else round(np.nanmean(f2_vals))
+                        if valid_target_f0s.size > 0 and f1_vals.size > 0 and f2_vals.size > 0:
+                            mean_f0 = round(np.mean(valid_target_f0s))
+                            mean_f1 = round(np.mean(f1_vals))
+                            mean_f2 = round(np.mean(f2_vals))
+
+                            row = [lang_code, file_id, mean_pitch_range, prev_label, label, i, next_label, preceded_by_consonants, followed_by_consonants, start, stop, intv_dur, mean_f0, mean_first_10_f0, mean_segment_f0, mean_f1, mean_f2, 
+                            word_label, word_start, word_stop, word_dur, round(total_duration*1000), total_intervals, start_percentage, utt_pos]
+
+                            # Midpoint F1 and F2 of every configuration of the sweep
+                            for config in formant_configs or []:
+                                sweep_f1s, sweep_f2s = formant_tracks[config]
+                                row += [window_mean(sweep_f1s, mid_lo[i], mid_hi[i]), window_mean(sweep_f2s, mid_lo[i], mid_hi[i])]
 
-                            results.append([lang_code, file_id, mean_pitch_range, prev_label, label, i, next_label, preceded_by_consonants, followed_by_consonants, start, stop, intv_dur, mean_f0, mean_first_10_f0, mean_segment_f0, mean_f1, mean_f2, 
-                            word_label, word_start, word_stop, word_dur, round(total_duration*1000), total_intervals, start_percentage, utt_pos])
+                            # F3, B1, B2 and intensity
+                            if extra_measures:
+                                row += extra_values[i]
+
+                            # F1 and F2 trajectories
+                            if trajectories:
+                                row += [np.nan if math.isnan(value) else round(value)
+                                        for values in (trajectory_values[0][i], trajectory_values[1][i]) for value in values]
+
+                            results.append(row)
                             processed_intervals += 1
                         else:
                             failed_intervals += 1
                     else:
                         failed_intervals += 1
+            clock = lap(timings, 'features', clock)
         #else:
         #    print(f'Skipping {tg_file}: the utterance contains less than three words.')
 
     except Exception as e:
         logging.error(f"Error processing {tg_file}: {e}")
 
-    return results, failed_intervals, processed_intervals
+    return results, failed_intervals, processed_intervals, timings
+
+# Helper function to process several TextGrid files in one task, to spread the scheduling and pickling overhead
+# The rows of all TextGrids are sent back as one column batch (see encode_batch)
+# speaker_configs holds the formant configuration chosen for the speaker of a TextGrid, if there is one
+def process_textgrid_batch(lang_code, tg_files, tg_dir, snd_dir, options, speaker_configs=None):
+    columns = result_columns(options.get('formant_configs'), options.get('trajectories'), options.get('extra_measures'))
+    speaker_configs = speaker_configs or {}
+    return encode_batch([(tg_file, *process_textgrid_file(lang_code, tg_file, tg_dir, snd_dir, speaker_config=speaker_configs.get(tg_file),
+                                                          **options))
+                         for tg_file in tg_files], columns)
+
+# Formant settings evaluated per speaker by default: maximum formant 4000 to 6000 Hz in steps of 250 Hz, 5 formants, 25 ms window
+default_ceiling_grid = [(float(ceiling), 5, 0.025) for ceiling in range(4000, 6001, 250)]
+
+# Helper function to choose the formant configuration of a speaker from a sample of their recordings
+# Every configuration of the grid is measured at the vowel midpoints with one decode and pitch analysis per recording (as in the
+# formant sweep), and the one with the lowest variance of log F1 and log F2 within the vowel categories is chosen (summed over the
+# vowels with at least two tokens measured with every configuration)
+# Returns the chosen configuration (None if no vowel has two such tokens) and the number of vowel tokens it is based on
+def choose_speaker_config(lang_code, tg_files, tg_dir, snd_dir, options, ceiling_grid):
+    options = dict(options, formant_configs=ceiling_grid, trajectories=False, extra_measures=False)
+    rows = [row for tg_file in tg_files for row in process_textgrid_file(lang_code, tg_file, tg_dir, snd_dir, **options)[0]]
+    sweep = pd.DataFrame([row[len(output_columns):] for row in rows], columns=result_columns(ceiling_grid)[len(output_columns):], dtype=float)
+    sweep['seg'] = [row[output_columns.index('seg')] for row in rows]
+    sweep = sweep.dropna()
+    sweep = sweep[sweep.groupby('seg')['seg'].transform('size') >= 2]
+    if sweep.empty:
+        return None, 0
+
+    scores = {}
+    for config in ceiling_grid:
+        variances = np.log(sweep[formant_config_columns(config)]).groupby(sweep['seg']).var()
+        scores[config] = variances.to_numpy().sum()
+    return min(scores, key=scores.get), len(sweep)
+
+# Helper function to get the resident memory of the current process in bytes (the peak resident memory where /proc is not available)
+def current_rss():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+# Helper function to process a batch and report the process ID and resident memory of the worker with its results
+def process_textgrid_batch_monitored(*args):
+    return process_textgrid_batch(*args), os.getpid(), current_rss()
+
+# Directory where every worker notes the TextGrid it is processing (set per worker by init_worker), or None without supervision
+# The note is a file named after the process ID of the worker, holding the path of the TextGrid; its modification time is the
+# start of the processing
+supervision_dir = None
+
+# Helper function to note the TextGrid the worker starts to process
+def mark_current_file(tg_path):
+    if supervision_dir:
+        marker_path = os.path.join(supervision_dir, str(os.getpid()))
+        with open(marker_path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(tg_path)
+        os.replace(marker_path + '.tmp', marker_path)
+
+# Helper function to run a task of a supervised pool, and remove the note of the worker when the task is done
+def run_supervised(fn, *args):
+    try:
+        return fn(*args)
+    finally:
+        try:
+            os.remove(os.path.join(supervision_dir, str(os.getpid())))
+        except FileNotFoundError:
+            pass
+
+# Initializer of the worker processes: build the per-worker lookup tables once and set up the decoded-audio cache
+def init_worker(audio_cache_dir=None, audio_cache_budget=0, track_store_dir=None, supervision=None):
+    global audio_cache, track_store, supervision_dir
+    if audio_cache_dir:
+        audio_cache = {'dir': audio_cache_dir, 'budget': audio_cache_budget, 'written': 0}
+    track_store = track_store_dir
+    supervision_dir = supervision
+    for vowel in target_vowels:
+        classify_label(vowel)
+        classify_label(vowel + 'ː')
+    classify_label('')
+
+# Helper function to run fn over the work items (tuples of arguments) with at most max_in_flight tasks submitted at a time
+# max_in_flight can also be a function returning the current limit, which is checked again after every finished task
+# Yields every work item with its finished future, in order of completion
+# If a worker dies and breaks the pool, nothing more is submitted: the remaining work items are yielded with a future that holds
+# the error, so that they are counted as failed as the tasks that were in flight
+def bounded_map(executor, fn, work_items, max_in_flight):
+    work_items = iter(work_items)
+    pending = {}
+    broken = None
+    while True:
+        limit = max_in_flight() if callable(max_in_flight) else max_in_flight
+        while len(pending) < limit:
+            item = next(work_items, None)
+            if item is None:
+                break
+            if broken is None:
+                try:
+                    pending[executor.submit(fn, *item)] = item
+                    continue
+                except BrokenProcessPool as e:
+                    logging.error(f"The process pool is broken, the remaining tasks are not run: {e}")
+                    broken = e
+            future = Future()
+            future.set_exception(broken)
+            pending[future] = item
+        if not pending:
+            return
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield pending.pop(future), future
+
+# Adaptive limit on the number of batches in flight, to use with bounded_map
+# Every interval seconds, the throughput (files/s) is compared with that of the interval before: the limit moves one more step in
+# the same direction if the throughput went up, and turns around if it went down. The limit stays between 1 and max_workers, and
+# at most as many workers as fit into memory_limit bytes with the largest resident memory seen per worker
+# A limit alone leaves the idle workers running with their memory, so when fewer workers fit into memory than the pool has, the pool
+# (a SupervisedPool, set as pool) is replaced by a smaller one
+class ConcurrencyController:
+    def __init__(self, max_workers, memory_limit, interval=30.0):
+        self.max_workers = max_workers
+        self.memory_limit = memory_limit
+        self.interval = interval
+        self.pool = None
+        self.limit = max(1, max_workers // 2)
+        self.step = 1
+        self.worker_rss = {}
+        self.last_throughput = None
+        self.window_start = time.time()
+        self.window_files = 0
+
+    def __call__(self):
+        return self.limit
+
+    def record(self, n_files, pid, rss):
+        self.worker_rss[pid] = max(rss, self.worker_rss.get(pid, 0))
+        self.window_files += n_files
+        now = time.time()
+        if now - self.window_start < self.interval:
+            return
+
+        throughput = self.window_files / (now - self.window_start)
+        if self.last_throughput is not None and throughput < self.last_throughput:
+            self.step = -self.step
+        memory_cap = max(1, int(self.memory_limit // max(self.worker_rss.values())))
+        if self.pool is not None:
+            self.pool.resize(memory_cap)
+        limit = max(1, min(self.limit + self.step, self.max_workers, memory_cap))
+        if limit != self.limit:
+            logging.info(f"Concurrency {self.limit} -> {limit} ({throughput:.2f} files/s, "
+                         f"max worker RSS {max(self.worker_rss.values()) / 1024 ** 2:.0f} MB)")
+        self.limit = limit
+        self.last_throughput = throughput
+        self.window_start, self.window_files = now, 0
+
+# Helper function to check whether a process is exiting, has ended or no longer exists (only where /proc exists)
+def process_ended(pid):
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+    except FileNotFoundError:
+        return os.path.isdir('/proc')
+    # (state zombie or dead, or the PF_EXITING flag)
+    return fields[0] in ('Z', 'X') or bool(int(fields[6]) & 0x4)
+
+# Process pool with supervised workers, used like ProcessPoolExecutor (submit and shutdown, or as a context manager)
+# With file_timeout, a watchdog thread kills every worker that has been processing the same TextGrid for more than file_timeout
+# seconds. A killed or crashed worker breaks the pool: a new pool takes its place, the TextGrid of the worker is quarantined, and the
+# tasks that were in flight are submitted again without the quarantined TextGrids (every task gets its TextGrids as its second
+# argument and their directory as its third, as process_textgrid_batch), at most max_retries times. The quarantined TextGrids are
+# listed in {lang_code}_v{ver_num}_quarantine.tsv in the output directory. With max_tasks_per_worker, every worker is replaced by a
+# new process after that many tasks, which returns the memory it has accumulated. With resize, the pool is replaced by one with
+# fewer workers
+class SupervisedPool:
+    def __init__(self, output_dir, file_timeout=None, max_tasks_per_worker=None, max_retries=3, **pool_args):
+        self.output_dir = output_dir
+        self.file_timeout = file_timeout
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.max_retries = max_retries
+        self.pool_args = pool_args
+        self.supervision_dir = tempfile.mkdtemp(prefix='.supervision_', dir=output_dir)
+        self.quarantined = set()
+        self.lock = threading.RLock()
+        self.executor = self.start()
+        self.stopped = threading.Event()
+        self.watchdog = None
+        if file_timeout:
+            self.watchdog = threading.Thread(target=self.watch, daemon=True)
+            self.watchdog.start()
+
+    def start(self):
+        pool_args = dict(self.pool_args, initargs=tuple(self.pool_args.get('initargs', ())) + (self.supervision_dir,))
+        if self.max_tasks_per_worker:
+            # (workers can only be replaced with a start method other than fork)
+            pool_args.update(max_tasks_per_child=self.max_tasks_per_worker, mp_context=multiprocessing.get_context('forkserver'))
+        executor = ProcessPoolExecutor(**pool_args)
+        # (the worker processes of the pool by pid, which the executor no longer exposes once it is shut down)
+        executor.worker_processes = executor._processes
+        return executor
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    def shutdown(self, wait=True):
+        self.stopped.set()
+        if self.watchdog:
+            self.watchdog.join()
+        self.executor.shutdown(wait=wait)
+        shutil.rmtree(self.supervision_dir, ignore_errors=True)
+
+    def submit(self, fn, *args):
+        future = Future()
+        self.resubmit(future, fn, args, 0)
+        return future
+
+    def resubmit(self, future, fn, args, retries):
+        with self.lock:
+            executor = self.executor
+            args = (args[0], [tg_file for tg_file in args[1] if os.path.join(args[2], tg_file) not in self.quarantined], *args[2:])
+        try:
+            task = executor.submit(run_supervised, fn, *args)
+        except BrokenProcessPool as e:
+            self.task_done(future, fn, args, retries, executor, None, e)
+            return
+        task.add_done_callback(lambda task: self.task_done(future, fn, args, retries, executor, task, task.exception()))
+
+    def task_done(self, future, fn, args, retries, executor, task, error):
+        if isinstance(error, BrokenProcessPool) and retries < self.max_retries:
+            self.restart(executor)
+            self.resubmit(future, fn, args, retries + 1)
+        elif error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(task.result())
+
+    # Replace the pool by one with fewer workers, if it has more than max_workers
+    # The workers of the old pool finish the tasks they have and then exit, which returns their memory
+    def resize(self, max_workers):
+        with self.lock:
+            if max_workers >= self.pool_args['max_workers']:
+                return
+            logging.info(f"Pool of {self.pool_args['max_workers']} -> {max_workers} workers")
+            self.pool_args['max_workers'] = max_workers
+            executor, self.executor = self.executor, self.start()
+        executor.shutdown(wait=False)
+
+    # Replace a broken pool (once, for the first of its tasks to fail), after quarantining the TextGrids of its workers that crashed
+    # Only the notes of the workers of the broken pool are checked, which are all still listed while its failed tasks are reported:
+    # the other workers of the broken pool are only stopped after this, so their notes are removed. So are the notes that workers
+    # of an earlier broken pool wrote before they were stopped (of ended processes outside the current pool)
+    def restart(self, executor):
+        with self.lock:
+            pool_pids = set(executor.worker_processes)
+            current_pids = set(self.executor.worker_processes)
+            for name in os.listdir(self.supervision_dir):
+                if not name.isdigit():
+                    continue
+                pid = int(name)
+                if pid in pool_pids and process_ended(pid):
+                    self.quarantine(name, 'crash')
+                elif pid in pool_pids or (pid not in current_pids and process_ended(pid)):
+                    try:
+                        os.remove(os.path.join(self.supervision_dir, name))
+                    except FileNotFoundError:
+                        pass
+            if executor is self.executor:
+                executor.shutdown(wait=False)
+                self.executor = self.start()
+
+    # Quarantine the TextGrid of a worker note, and remove the note; returns False if the note is gone
+    def quarantine(self, name, reason):
+        marker_path = os.path.join(self.supervision_dir, name)
+        try:
+            with open(marker_path, encoding='utf-8') as f:
+                tg_path = f.read()
+            os.remove(marker_path)
+        except FileNotFoundError:
+            return False
+        self.quarantined.add(tg_path)
+        logging.warning(f"Quarantined {tg_path} ({reason}).")
+        lang_dir = os.path.dirname(os.path.dirname(tg_path))
+        quarantine_path = os.path.join(self.output_dir, f'{os.path.basename(lang_dir)}_quarantine.tsv')
+        new_file = not os.path.exists(quarantine_path)
+        with open(quarantine_path, 'a', encoding='utf-8') as f:
+            if new_file:
+                f.write('file\treason\n')
+            f.write(f'{os.path.basename(tg_path)}\t{reason}\n')
+        return True
+
+    # Kill the workers that are stuck on a TextGrid (run on the watchdog thread)
+    def watch(self):
+        while not self.stopped.wait(min(1.0, self.file_timeout / 10)):
+            now = time.time()
+            for name in os.listdir(self.supervision_dir):
+                try:
+                    stuck = name.isdigit() and now - os.stat(os.path.join(self.supervision_dir, name)).st_mtime > self.file_timeout
+                except FileNotFoundError:
+                    continue
+                if not stuck:
+                    continue
+                with self.lock:
+                    # (a note left by a worker of a broken pool)
+                    if process_ended(int(name)):
+                        try:
+                            os.remove(os.path.join(self.supervision_dir, name))
+                        except FileNotFoundError:
+                            pass
+                        continue
+                    if self.quarantine(name, f'timeout after {self.file_timeout:g} s'):
+                        try:
+                            os.kill(int(name), signal.SIGKILL)
+                        except ProcessLookupError:
+                            pass
+
+# Helper function to summarise the stage timings of the processed TextGrids of a language
+def summarise_timings(job):
+    timings = job['timings']
+    summary = {
+        'lang_code': job['lang_code'],
+        'ver_num': job['ver_num'],
+        'files': timings['files'],
+        'processed_intervals': job['processed_intervals'],
+        'failed_intervals': job['failed_intervals'],
+        'stages': {},
+    }
+    for stage in timing_stages:
+        total = timings['total'][stage]
+        summary['stages'][stage] = {
+            'total_s': round(total, 3),
+            'mean_ms': round(1000 * total / timings['files'], 3) if timings['files'] else None,
+            'max_ms': round(1000 * timings['max'][stage], 3),
+            'share': round(total / sum(timings['total'].values()), 4) if any(timings['total'].values()) else None,
+        }
+    return summary
+
+# Columns of the output CSV
+output_columns = ['lang_code', 'file_id', 'mean_pitch_range', 'prev_seg', 'seg', 'seg_intv', 'next_seg', 'preceded_by_cons', 'followed_by_cons', 'seg_start', 'seg_stop', 'seg_dur', 'F0_mid10', 'F0_first10', 'F0_seg_mean', 'F1', 'F2',
+                  'word', 'word_start', 'word_stop', 'word_dur', 'utt_dur', 'n_phone', 'utt_perc', 'utt_pos']
+# Text columns (read back as strings, so that labels like 'NA' or '' are kept as they are)
+string_columns = ['lang_code', 'file_id', 'mean_pitch_range', 'prev_seg', 'seg', 'next_seg', 'word', 'utt_pos']
+# Whole-number columns that are never missing, and true/false columns
+int_columns = ['seg_intv', 'seg_dur', 'F0_mid10', 'F1', 'F2', 'word_dur', 'utt_dur', 'n_phone']
+bool_columns = ['preceded_by_cons', 'followed_by_cons']
+# Whole-number columns that can be missing; pandas writes them as floats only if a value is missing somewhere in the output
+nullable_int_columns = ['F0_first10', 'F0_seg_mean']
+
+# Files of a checkpoint directory besides the shards: the manifest of the finished TextGrids, and the settings of the run
+manifest_name = 'manifest.tsv'
+settings_name = 'settings.json'
+
+# Helper function to get the output columns of a run, with the midpoint F1 and F2 of every configuration of the formant sweep,
+# the extra measures and the trajectory columns if they are extracted
+def result_columns(formant_configs=None, trajectories=False, extra_measures=False):
+    columns = list(output_columns)
+    for config in formant_configs or []:
+        columns += formant_config_columns(config)
+    if extra_measures:
+        columns += extra_measure_columns
+    if trajectories:
+        columns += trajectory_columns
+    return columns
+
+# Helper function to get the whole-number columns of a run that can be missing (all extra columns except the intensity)
+def nullable_result_columns(columns):
+    return nullable_int_columns + [col for col in columns[len(output_columns):] if col != 'intensity']
+
+# Compact form of result rows, as the workers send them to the main process
+# The columns of each type are stacked into one array per type (one column per row of the array): the text columns as integer codes
+# into the list of their distinct values (categories), the whole-number columns as ints (16-bit where the values allow it) or, if they
+# can be missing, as 32-bit floats (exact for these values), the true/false columns as booleans and all other columns as floats
+ColumnBatch = namedtuple('ColumnBatch', ['n_rows', 'arrays', 'categories'])
+column_types = {'codes': np.int32, 'ints': np.int32, 'nullable_ints': np.float32, 'bools': np.bool_, 'floats': np.float64}
+
+# Helper function to get the type of a column in a column batch
+def column_type(col):
+    if col in string_columns:
+        return 'codes'
+    if col in int_columns:
+        return 'ints'
+    if col in nullable_int_columns:
+        return 'nullable_ints'
+    if col in bool_columns:
+        return 'bools'
+    return 'floats'
+
+# Helper function to turn result rows into a column batch
+def encode_rows(rows, columns):
+    values = {kind: [] for kind in column_types}
+    categories = []
+    for col, column_values in zip(columns, zip(*rows)):
+        kind = column_type(col)
+        if kind == 'codes':
+            distinct = list(dict.fromkeys(column_values))
+            codes = {value: code for code, value in enumerate(distinct)}
+            column_values = [codes[value] for value in column_values]
+            categories.append(distinct)
+        values[kind].append(column_values)
+
+    arrays = {}
+    for kind, dtype in column_types.items():
+        if kind == 'codes' and all(len(distinct) < 2 ** 15 for distinct in categories):
+            dtype = np.int16
+        if kind == 'ints' and all(-2 ** 15 <= value < 2 ** 15 for column_values in values[kind] for value in column_values):
+            dtype = np.int16
+        n_columns = sum(column_type(col) == kind for col in columns)
+        arrays[kind] = np.array(values[kind], dtype=dtype).reshape(n_columns, len(rows))
+    return ColumnBatch(len(rows), arrays, categories)
+
+# Helper function to get rows lo to hi of a column batch, as views on its arrays
+def slice_columns(batch, lo, hi):
+    return ColumnBatch(hi - lo, {kind: array[:, lo:hi] for kind, array in batch.arrays.items()}, batch.categories)
+
+# Helper function to encode the results of the TextGrids of a batch: the rows of all of them go into one column batch, and every
+# TextGrid keeps its number of rows
+def encode_batch(results, columns):
+    rows = [row for _, res, _, _, _ in results for row in res]
+    file_results = [(tg_file, len(res), failed_intervals, processed_intervals, timings)
+                    for tg_file, res, failed_intervals, processed_intervals, timings in results]
+    return encode_rows(rows, columns), file_results
+
+# Helper function to split an encoded batch back into the results of its TextGrids, each with a view on its rows
+def split_batch(batch_result):
+    column_batch, file_results = batch_result
+    lo = 0
+    for tg_file, n_rows, failed_intervals, processed_intervals, timings in file_results:
+        yield tg_file, slice_columns(column_batch, lo, lo + n_rows), failed_intervals, processed_intervals, timings
+        lo += n_rows
+
+# Helper function to get the values of one column of a column batch
+def batch_column(batch, columns, col):
+    kind = column_type(col)
+    k = [c for c in columns if column_type(c) == kind].index(col)
+    if kind == 'codes':
+        return [batch.categories[k][code] for code in batch.arrays[kind][k]]
+    return batch.arrays[kind][k]
+
+# Helper function to concatenate column batches into one DataFrame, column by column
+def batches_to_frame(batches, columns):
+    batches = [batch for batch in batches if batch.n_rows]
+    if not batches:
+        return pd.DataFrame(columns=columns)
+    data = {}
+    positions = dict.fromkeys(column_types, 0)
+    for col in columns:
+        kind = column_type(col)
+        k = positions[kind]
+        positions[kind] += 1
+        if kind == 'codes':
+            data[col] = union_categoricals([pd.Categorical.from_codes(batch.arrays[kind][k], batch.categories[k]) for batch in batches])
+        else:
+            data[col] = np.concatenate([batch.arrays[kind][k] for batch in batches])
+            if kind == 'nullable_ints':
+                data[col] = data[col].astype(np.float64)
+    return pd.DataFrame(data, columns=columns)
+
+# Helper function to read a result shard back with the column types the extractor produced
+# With chunksize, the shard is read in chunks of that many rows
+def read_shard(shard_path, usecols=None, nullable_columns=nullable_int_columns, chunksize=None):
+    return pd.read_csv(shard_path, usecols=usecols, dtype={col: str for col in string_columns}, chunksize=chunksize,
+                       keep_default_na=False, na_values={col: ['NaN'] for col in nullable_columns}, float_precision='round_trip')
+
+# Helper function to persist the column batches of finished TextGrids and record them in the manifest
+def write_shard(checkpoint_dir, shard_num, batches, finished_files, columns=output_columns):
+    frame = batches_to_frame(batches, columns) if any(batch.n_rows for batch in batches) else None
+    write_frame_shard(checkpoint_dir, shard_num, frame, finished_files)
+
+# Helper function to persist the rows of finished TextGrids (None if there are none) and record them in the manifest
+# The shard is renamed into place before the manifest is appended, so every TextGrid in the manifest has its rows on disk
+def write_frame_shard(checkpoint_dir, shard_num, frame, finished_files):
+    shard_name = None
+    if frame is not None:
+        shard_name = f'shard_{shard_num:06d}.csv'
+        shard_path = os.path.join(checkpoint_dir, shard_name)
+        frame.to_csv(shard_path + '.tmp', index=False, na_rep='NaN')
+        os.replace(shard_path + '.tmp', shard_path)
+
+    with open(os.path.join(checkpoint_dir, manifest_name), 'a', encoding='utf-8') as manifest:
+        for tg_file, failed_intervals, processed_intervals in finished_files:
+            manifest.write(f'{tg_file}\t{shard_name or "-"}\t{failed_intervals}\t{processed_intervals}\n')
+        manifest.flush()
+        os.fsync(manifest.fileno())
+
+# Helper function to load the manifest of a previous (interrupted) run
+# Returns the finished TextGrids with their interval counts and the shards that hold their rows
+def load_manifest(checkpoint_dir):
+    finished = {}
+    shards = set()
+    manifest_path = os.path.join(checkpoint_dir, manifest_name)
+    if not os.path.exists(manifest_path):
+        return finished, []
+
+    with open(manifest_path, encoding='utf-8') as manifest:
+        content = manifest.read()
+
+    # Drop an incomplete last line left by a crash, so that new entries start on a line of their own
+    if content and not content.endswith('\n'):
+        content = content[:content.rfind('\n') + 1]
+        with open(manifest_path, 'w', encoding='utf-8') as manifest:
+            manifest.write(content)
+
+    for line in content.splitlines():
+        tg_file, shard_name, failed_intervals, processed_intervals = line.split('\t')
+        finished[tg_file] = (int(failed_intervals), int(processed_intervals))
+        if shard_name != '-':
+            shards.add(shard_name)
+    return finished, sorted(shards)
+
+# Helper function to record the output columns and extraction options of a checkpoint directory when it is first used, or to check
+# that a run resuming from it has the same ones (shards with other columns cannot be merged, and other options give other values)
+def check_checkpoint_settings(checkpoint_dir, columns, options):
+    settings = {'columns': columns, 'options': options_signature(options or {})}
+    settings_path = os.path.join(checkpoint_dir, settings_name)
+    if not os.path.exists(settings_path):
+        with open(settings_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(settings, f)
+        os.replace(settings_path + '.tmp', settings_path)
+        return
+    with open(settings_path, encoding='utf-8') as f:
+        if json.load(f) != settings:
+            raise ValueError(f"The checkpoint directory {checkpoint_dir} was written with other output columns or options; "
+                             f"resume with the same options, or use another checkpoint directory")
+
+# Helper function to get the next free shard number (shards left over from a crash are never reused)
+def next_shard_num(checkpoint_dir):
+    nums = [int(name[len('shard_'):len('shard_') + 6]) for name in os.listdir(checkpoint_dir) if name.startswith('shard_')]
+    return max(nums) + 1 if nums else 0
+
+# Streaming sink for the results: the column batches are kept in memory only until a shard is written
+# A shard is written every shard_size finished TextGrids or as soon as max_rows rows are buffered, whichever comes first
+class ShardWriter:
+    def __init__(self, shard_dir, shard_size=1000, max_rows=50000, columns=output_columns):
+        self.shard_dir = shard_dir
+        self.columns = columns
+        self.shard_size = shard_size
+        self.max_rows = max_rows
+        self.shard_num = next_shard_num(shard_dir)
+        self.batches = []
+        self.n_rows = 0
+        self.finished_files = []
+
+    def add(self, tg_file, batch, failed_intervals, processed_intervals):
+        self.batches.append(batch)
+        self.n_rows += batch.n_rows
+        self.finished_files.append((tg_file, failed_intervals, processed_intervals))
+        if len(self.finished_files) >= self.shard_size or self.n_rows >= self.max_rows:
+            self.flush()
+
+    def flush(self):
+        if self.finished_files:
+            write_shard(self.shard_dir, self.shard_num, self.batches, self.finished_files, self.columns)
+            self.shard_num += 1
+            self.batches, self.n_rows, self.finished_files = [], 0, []
+
+# Helper function to merge result shards into one CSV, one shard at a time
+# With a trajectory CSV, the trajectory columns go into this side table instead, keyed by file_id and seg_intv
+def merge_shards(shard_paths, output_csv, nullable_columns=nullable_int_columns, trajectory_csv=None):
+    # Check which of the nullable columns have a missing value anywhere, to format them like a single DataFrame would
+    has_nan = {col: False for col in nullable_columns}
+    for shard_path in shard_paths:
+        shard = read_shard(shard_path, usecols=nullable_columns, nullable_columns=nullable_columns)
+        for col in nullable_columns:
+            has_nan[col] = has_nan[col] or bool(shard[col].isna().any())
+
+    n_rows = 0
+    for shard_path in shard_paths:
+        shard = read_shard(shard_path, nullable_columns=nullable_columns)
+        for col in nullable_columns:
+            shard[col] = shard[col].astype('float64' if has_nan[col] else 'int64')
+        if trajectory_csv:
+            shard[['file_id', 'seg_intv'] + trajectory_columns].to_csv(trajectory_csv, index=False, na_rep='NaN',
+                                                                       mode='a' if n_rows else 'w', header=not n_rows)
+            shard = shard.drop(columns=trajectory_columns)
+        shard.to_csv(output_csv, index=False, na_rep='NaN', mode='a' if n_rows else 'w', header=not n_rows)
+        n_rows += len(shard)
+    return n_rows
+
+# Helper function to get the fingerprints of the TextGrid and the mp3 of a recording (None for a missing mp3)
+def fingerprint_file(tg_file, tg_dir, snd_dir):
+    snd_file, _ = sound_path(tg_file, snd_dir)
+    return file_digest(os.path.join(tg_dir, tg_file)), file_digest(snd_file) if os.path.exists(snd_file) else None
+
+# Helper function to fingerprint all recordings of a language, on a few threads since this is mostly reading files
+# Returns a dict from TextGrid to its fingerprints
+def fingerprint_files(tg_files, tg_dir, snd_dir):
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        return dict(zip(tg_files, pool.map(fingerprint_file, tg_files, repeat(tg_dir), repeat(snd_dir))))
+
+# Helper function to get the options that decide the output rows, in the form they are saved in the sources file
+def options_signature(options):
+    return json.loads(json.dumps(options, sort_keys=True, default=sorted))
+
+# Helper function to get the path of the sources file of a language: the options of the run, and for every TextGrid of the output
+# its fingerprints and interval counts
+def sources_path(output_dir, lang_code, ver_num):
+    return os.path.join(output_dir, f'{lang_code}_v{ver_num}_sources.json')
+
+# Helper function to load the recordings of the sources file of a previous version, if it was extracted with the same options
+# Returns a dict from TextGrid to [TextGrid fingerprint, mp3 fingerprint, failed intervals, processed intervals], or None
+def load_sources(path, signature):
+    if not os.path.exists(path):
+        logging.warning(f"No sources file {path} of the previous version. Processing all recordings.")
+        return None
+    with open(path, encoding='utf-8') as f:
+        sources = json.load(f)
+    if sources['options'] != signature:
+        logging.warning(f"The previous version in {path} was extracted with other options. Processing all recordings.")
+        return None
+    return sources['files']
+
+# Helper function to copy the rows of the reused recordings (by file_id, with their TextGrid and interval counts) from the output
+# of a previous version into result shards, max_rows rows at a time
+# The rows of a recording are together in the output, so every shard is cut after the last row of a recording; the reused
+# recordings without rows are recorded in the manifest at the end
+def reuse_previous_rows(shard_dir, reused, previous_csv, previous_trajectory_csv, nullable_columns, max_rows):
+    shard_num = next_shard_num(shard_dir)
+    chunks = read_shard(previous_csv, nullable_columns=nullable_columns, chunksize=max_rows)
+    if previous_trajectory_csv:
+        trajectory_chunks = read_shard(previous_trajectory_csv, nullable_columns=nullable_columns, chunksize=max_rows)
+        chunks = (pd.concat([chunk, trajectories[trajectory_columns]], axis=1) for chunk, trajectories in zip(chunks, trajectory_chunks))
+
+    carry = None
+    written = set()
+    for chunk in chunks:
+        chunk = chunk[chunk['file_id'].isin(reused)]
+        if carry is not None:
+            chunk = pd.concat([carry, chunk])
+        if not len(chunk):
+            continue
+        last = chunk['file_id'].to_numpy() == chunk['file_id'].iat[-1]
+        carry, chunk = chunk[last], chunk[~last]
+        if len(chunk):
+            file_ids = chunk['file_id'].unique()
+            write_frame_shard(shard_dir, shard_num, chunk, [reused[file_id] for file_id in file_ids])
+            written.update(file_ids)
+            shard_num += 1
+    if carry is not None and len(carry):
+        write_frame_shard(shard_dir, shard_num, carry, [reused[carry['file_id'].iat[0]]])
+        written.add(carry['file_id'].iat[0])
+    write_frame_shard(shard_dir, shard_num + 1, None, [reused[file_id] for file_id in reused if file_id not in written])
+
+# Helper function to create a file with the given content only if it does not exist yet
+# The file is written under a temporary name and hard-linked into place, which is atomic also on NFS; returns False if it exists
+def create_once(path, content, node_id):
+    tmp_path = f'{path}.{node_id}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    try:
+        os.link(tmp_path, path)
+        return True
+    except FileExistsError:
+        return False
+    finally:
+        os.remove(tmp_path)
+
+# Work queue of one language on a directory shared by several invocations (nodes) of this script
+# The first node splits the TextGrids into batches and saves them to queue.json. A node works on a batch while it holds its lease
+# file in leases/, whose modification time it renews; a lease that was not renewed for lease_seconds belongs to a dead node and is
+# taken over by the next node that finds it. The rows of a finished batch are saved as a result shard with its manifest in
+# results/batch_*/, which is renamed into place at once, so a batch is done exactly when its result directory exists
+class WorkQueue:
+    def __init__(self, queue_dir, tg_files, batch_size, columns, lease_seconds=600.0):
+        self.queue_dir = queue_dir
+        self.columns = columns
+        self.lease_seconds = lease_seconds
+        self.node_id = f'{socket.gethostname()}_{os.getpid()}'
+        self.held = {} # batch number -> time of the last renewal of its lease
+        self.failed = set() # batches that failed on this node, which it does not claim again
+        os.makedirs(os.path.join(queue_dir, 'leases'), exist_ok=True)
+        os.makedirs(os.path.join(queue_dir, 'results'), exist_ok=True)
+
+        tg_files = sorted(tg_files)
+        layout = {'columns': columns, 'batches': [tg_files[i:i + batch_size] for i in range(0, len(tg_files), batch_size)]}
+        create_once(os.path.join(queue_dir, 'queue.json'), json.dumps(layout), self.node_id)
+        with open(os.path.join(queue_dir, 'queue.json'), encoding='utf-8') as f:
+            layout = json.load(f)
+        if layout['columns'] != columns:
+            raise ValueError(f"The work queue in {queue_dir} was set up with other output columns; use the same options on every node")
+        self.batches = layout['batches']
+        self.batch_nums = {tg_files[0]: batch_num for batch_num, tg_files in enumerate(self.batches)}
+
+    def lease_path(self, batch_num):
+        return os.path.join(self.queue_dir, 'leases', f'batch_{batch_num:06d}.lease')
+
+    def result_dir(self, batch_num):
+        return os.path.join(self.queue_dir, 'results', f'batch_{batch_num:06d}')
+
+    def is_done(self, batch_num):
+        return os.path.isdir(self.result_dir(batch_num))
+
+    def finished(self):
+        return all(self.is_done(batch_num) for batch_num in range(len(self.batches)))
+
+    # Try to take a lease file, taking over an expired one
+    def take_lease(self, path):
+        if create_once(path, self.node_id, self.node_id):
+            return True
+        try:
+            expired = time.time() - os.stat(path).st_mtime > self.lease_seconds
+        except FileNotFoundError:
+            return False
+        if not expired:
+            return False
+        # Only one of the nodes that find the expired lease can rename it away
+        stale_path = f'{path}.{self.node_id}.stale'
+        try:
+            os.rename(path, stale_path)
+        except FileNotFoundError:
+            return False
+        os.remove(stale_path)
+        return create_once(path, self.node_id, self.node_id)
+
+    def claim(self, batch_num):
+        if not self.take_lease(self.lease_path(batch_num)):
+            return False
+        # The batch may have been finished between the check of the caller and the lease
+        if self.is_done(batch_num):
+            os.remove(self.lease_path(batch_num))
+            return False
+        self.held[batch_num] = time.time()
+        return True
+
+    # Yield the batches that are neither done, nor leased by another node, nor failed on this node, each after taking its lease
+    # (no more batches are claimed once stop returns True)
+    def claim_batches(self, stop=lambda: False):
+        for batch_num, tg_files in enumerate(self.batches):
+            if stop():
+                return
+            if batch_num not in self.held and batch_num not in self.failed and not self.is_done(batch_num) and self.claim(batch_num):
+                yield batch_num, tg_files
+
+    # Check whether every batch that is not done failed on this node, so that it cannot finish the queue
+    def stuck(self):
+        return bool(self.failed) and all(self.is_done(batch_num) or batch_num in self.failed for batch_num in range(len(self.batches)))
+
+    # Renew the leases of the batches in progress, every quarter of the lease time
+    def renew(self):
+        now = time.time()
+        for batch_num, renewed in self.held.items():
+            if now - renewed > self.lease_seconds / 4:
+                try:
+                    os.utime(self.lease_path(batch_num))
+                    self.held[batch_num] = now
+                except FileNotFoundError:
+                    pass
+
+    # Save the results of a batch and give up its lease
+    # If another node finished the same batch in the meantime (after taking over the lease), its identical results are kept
+    def complete(self, batch_num, batches, finished_files):
+        tmp_dir = f'{self.result_dir(batch_num)}.{self.node_id}.tmp'
+        os.makedirs(tmp_dir, exist_ok=True)
+        write_shard(tmp_dir, 0, batches, finished_files, self.columns)
+        try:
+            os.rename(tmp_dir, self.result_dir(batch_num))
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.release(batch_num)
+
+    # Give up the lease of a batch without results, so that it stays in the queue for the other nodes (or a later run)
+    # With failed, the batch is not claimed by this node again
+    def release(self, batch_num, failed=False):
+        if failed:
+            self.failed.add(batch_num)
+        self.held.pop(batch_num, None)
+        try:
+            with open(self.lease_path(batch_num), encoding='utf-8') as f:
+                ours = f.read() == self.node_id
+            if ours:
+                os.remove(self.lease_path(batch_num))
+        except FileNotFoundError:
+            pass
+
+    # Merge the result shards of all batches into the output CSV, if no other node is doing so or has done so already
+    # Returns the interval counts as (failed, processed), or None if the merge was left to another node
+    def merge(self, output_csv, nullable_columns, trajectory_csv=None):
+        merged_path = os.path.join(self.queue_dir, 'merged')
+        if os.path.exists(merged_path) or not self.take_lease(os.path.join(self.queue_dir, 'merge.lease')):
+            return None
+        failed_intervals, processed_intervals, shard_paths = 0, 0, []
+        for batch_num in range(len(self.batches)):
+            finished, shards = load_manifest(self.result_dir(batch_num))
+            failed_intervals += sum(counts[0] for counts in finished.values())
+            processed_intervals += sum(counts[1] for counts in finished.values())
+            shard_paths += [os.path.join(self.result_dir(batch_num), shard) for shard in shards]
+
+        # (a node that takes over the merge from a slow node writes its own temporary files, with the same content)
+        n_rows = 0
+        if shard_paths:
+            tmp_suffix = f'.{self.node_id}.tmp'
+            n_rows = merge_shards(shard_paths, output_csv + tmp_suffix, nullable_columns, trajectory_csv and trajectory_csv + tmp_suffix)
+            os.replace(output_csv + tmp_suffix, output_csv)
+            if trajectory_csv:
+                os.replace(trajectory_csv + tmp_suffix, trajectory_csv)
+        create_once(merged_path, output_csv, self.node_id)
+        try:
+            os.remove(os.path.join(self.queue_dir, 'merge.lease'))
+        except FileNotFoundError:
+            pass
+        return n_rows, failed_intervals, processed_intervals
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Process TextGrid files for speech analysis.")
     parser.add_argument("commonvoice_dir", type=str, help="Path to the CommonVoice directory")
-    parser.add_argument("lang_code", type=str, help="Language code")
-    parser.add_argument("ver_num", type=str, help="Version number")
+    parser.add_argument("lang_code", type=str, help="Language code, or 'all' to process every language in the CommonVoice directory")
+    parser.add_argument("ver_num", type=str, help="Version number, or 'all' to process every version (only with lang_code 'all')")
     parser.add_argument("output_dir", type=str, help="Directory to save the output CSV file")
-    return parser.parse_args()
+    parser.add_argument("--checkpoint_dir", type=str, default=None,
+                        help="Directory for result shards and the manifest of finished TextGrids; rerunning with the same directory resumes the run")
+    parser.add_argument("--previous_ver", type=str, default=None,
+                        help="Version number of a previous extraction in the output directory: the rows of the recordings whose TextGrid "
+                             "and mp3 are unchanged are copied from its output, and only new or changed recordings are processed")
+    parser.add_argument("--save_sources", action="store_true",
+                        help="Save the fingerprints of the TextGrids and mp3 files to {lang_code}_v{ver_num}_sources.json, so that the next "
+                             "version can be extracted with --previous_ver (always done with --previous_ver)")
+    parser.add_argument("--queue_dir", type=str, default=None,
+                        help="Shared directory of a work queue: several invocations (e.g. on different machines) with the same directory and "
+                             "options share the batches of TextGrids, and the last one to finish writes the output CSV")
+    parser.add_argument("--lease_seconds", type=float, default=600.0,
+                        help="Time after which a batch that a node has not reported on is given to another node in --queue_dir mode; must be "
+                             "well above the time of one batch (default: 600)")
+    parser.add_argument("--shard_size", type=int, default=1000, help="Number of finished TextGrids per result shard (default: 1000)")
+    parser.add_argument("--audio_cache_dir", type=str, default=None,
+                        help="Directory for a cache of the decoded mp3 files, reused by later runs")
+    parser.add_argument("--audio_cache_gb", type=float, default=50.0,
+                        help="Size budget of the decoded-audio cache in GB; the least recently used files are removed first (default: 50)")
+    parser.add_argument("--track_store_dir", type=str, default=None,
+                        help="Directory to store the pitch and formant tracks (F1-F5 and B1-B5) of every recording; later runs with the "
+                             "same regions read the tracks from there instead of analysing the audio again")
+    parser.add_argument("--formant_sweep", type=parse_formant_configs, default=None,
+                        help="Extra formant configurations as 'maximum_formant:number_of_formants:window_length,...' (e.g. '5000:5:0.025,4500:5:0.025'); "
+                             "the midpoint F1 and F2 of each configuration are added as extra columns, from the same decoded sound and pitch")
+    parser.add_argument("--speaker_info_dir", type=str, default=None,
+                        help="Folder with the speaker TSVs of filter_csv.py (columns path and speaker_id); chooses the formant settings per "
+                             "speaker from --ceiling_grid instead of per recording by mean F0")
+    parser.add_argument("--ceiling_grid", type=parse_formant_configs, default=default_ceiling_grid,
+                        help="Formant settings evaluated per speaker, as in --formant_sweep (default: 4000 to 6000 Hz in steps of 250 Hz, "
+                             "5 formants, 25 ms)")
+    parser.add_argument("--ceiling_sample_files", type=int, default=10,
+                        help="Number of recordings per speaker on which the formant settings are evaluated (default: 10)")
+    parser.add_argument("--ceiling_min_files", type=int, default=20,
+                        help="Minimum number of recordings of a speaker to choose their own formant settings (default: 20)")
+    parser.add_argument("--speaker_quota", type=int, default=None,
+                        help="Stop processing the recordings of a speaker once they have this many rows of each of --quota_vowels (times "
+                             "--quota_headroom), e.g. 20 for filter_csv.py; the recordings are processed in turns by speaker")
+    parser.add_argument("--quota_speaker_dir", type=str, default=None,
+                        help="Folder with the speaker TSVs of filter_csv.py (columns path and speaker_id) for --speaker_quota; recordings "
+                             "without a known speaker are left out")
+    parser.add_argument("--quota_vowels", type=lambda text: set(text.split(',')), default={'a', 'i', 'u'},
+                        help="Vowel labels counted for --speaker_quota, comma-separated (default: a,i,u)")
+    parser.add_argument("--quota_headroom", type=float, default=1.5,
+                        help="Factor on --speaker_quota, for the rows that filter_csv.py later drops as outliers (default: 1.5)")
+    parser.add_argument("--trajectories", action="store_true",
+                        help="Also extract F1 and F2 at 10 equally spaced points of every vowel (5%%, 15%%, ..., 95%%) into a side table "
+                             "{lang_code}_v{ver_num}_trajectories.csv, keyed by file_id and seg_intv")
+    parser.add_argument("--extra_measures", action="store_true",
+                        help="Also extract F3, B1 and B2 (Hz) of the chosen formant configuration and the intensity (dB) as means over "
+                             "the midpoint window of every vowel, in the columns F3, B1, B2 and intensity")
+    parser.add_argument("--vowel_regions_only", action="store_true",
+                        help="Only analyse pitch and formants in padded regions around the vowels that can yield a result, and estimate "
+                             "the mean F0 of the recording from these regions (faster, but values can differ slightly from a full analysis)")
+    parser.add_argument("--region_padding", type=float, default=0.1,
+                        help="Padding in seconds around each vowel in --vowel_regions_only mode (default: 0.1)")
+    parser.add_argument("--keep_vowels", type=lambda text: set(text.split(',')), default=None,
+                        help="Only extract these vowel labels (comma-separated, e.g. the a/i/u variants of filter_csv.py)")
+    parser.add_argument("--min_seg_dur", type=int, default=0, help="Only extract vowels of at least this duration in ms (e.g. 50)")
+    parser.add_argument("--min_utt_dur", type=int, default=0,
+                        help="Only extract recordings whose utterance duration (utt_dur) is at least this many ms (e.g. 500)")
+    parser.add_argument("--timings", action="store_true",
+                        help="Write the time spent in each stage (TextGrid parsing, decoding, pitch, formants, features) per file as JSON lines "
+                             "and as a summary JSON next to the output CSV")
+    parser.add_argument("--batch_size", type=int, default=20, help="Number of TextGrids processed per task (default: 20)")
+    parser.add_argument("--max_workers", type=int, default=None,
+                        help="Number of worker processes (default: the number of CPUs, at most 10)")
+    parser.add_argument("--adaptive_workers", action="store_true",
+                        help="Adapt the number of busy workers (up to --max_workers) to the throughput and the memory use of the workers")
+    parser.add_argument("--adapt_interval", type=float, default=30.0,
+                        help="Seconds between two adjustments in --adaptive_workers mode (default: 30)")
+    parser.add_argument("--memory_limit_gb", type=float, default=None,
+                        help="Memory available to the workers in --adaptive_workers mode, in GB; workers that do not fit are stopped "
+                             "(default: 80%% of the physical memory)")
+    parser.add_argument("--file_timeout", type=float, default=None,
+                        help="Seconds after which a worker stuck on one TextGrid is killed and replaced; the TextGrid is skipped and listed "
+                             "in {lang_code}_v{ver_num}_quarantine.tsv next to the output, as are TextGrids on which a worker crashed")
+    parser.add_argument("--max_tasks_per_worker", type=int, default=None,
+                        help="Replace every worker by a new process after this many batches, to return the memory it has accumulated")
+    parser.add_argument("--max_buffered_rows", type=int, default=50000,
+                        help="Maximum number of result rows kept in memory before they are written to disk (default: 50000)")
+    args = parser.parse_args()
+    if args.queue_dir and (args.checkpoint_dir or args.speaker_info_dir or args.timings or args.save_sources):
+        parser.error("--queue_dir cannot be combined with --checkpoint_dir, --speaker_info_dir, --timings or --save_sources")
+    if args.speaker_quota and (not args.quota_speaker_dir or args.queue_dir):
+        parser.error("--speaker_quota needs --quota_speaker_dir, and cannot be combined with --queue_dir")
+    if args.previous_ver and (args.queue_dir or args.speaker_info_dir or args.ver_num == 'all'):
+        parser.error("--previous_ver needs a single ver_num, and cannot be combined with --queue_dir or --speaker_info_dir")
+    return args
 
-def main(commonvoice_dir, lang_code, ver_num, output_dir):
-    # Record the start time
-    start_time = time.time()
+# Helper function to find all {lang_code}_v{ver_num} directories with TextGrids in the CommonVoice directory
+# ver_num 'all' accepts every version
+def find_languages(commonvoice_dir, ver_num='all'):
+    languages = []
+    for entry in sorted(os.scandir(commonvoice_dir), key=lambda entry: entry.name):
+        match = re.fullmatch(r'(.+)_v([^_]+)', entry.name)
+        if entry.is_dir() and match and os.path.isdir(os.path.join(entry.path, 'output')):
+            if ver_num == 'all' or match.group(2) == ver_num:
+                languages.append((match.group(1), match.group(2)))
+    return languages
 
+# Helper function to set up the extraction of one language: list the TextGrids still to do and open the result writer
+def start_language(commonvoice_dir, lang_code, ver_num, output_dir, checkpoint_dir, shard_size, max_buffered_rows, columns, timings=False,
+                   options=None, previous_ver=None, save_sources=False):
     # Define paths
     lang_dir = os.path.join(commonvoice_dir, f'{lang_code}_v{ver_num}')
     tg_dir = os.path.join(lang_dir, 'output')
-    snd_dir = os.path.join(lang_dir, 'validated')
-    output_csv = os.path.join(output_dir, f'{lang_code}_v{ver_num}_dur_f0_formants.csv')
+    job = {
+        'lang_code': lang_code,
+        'ver_num': ver_num,
+        'tg_dir': tg_dir,
+        'snd_dir': os.path.join(lang_dir, 'validated'),
+        'output_csv': os.path.join(output_dir, f'{lang_code}_v{ver_num}_dur_f0_formants.csv'),
+        'trajectory_csv': os.path.join(output_dir, f'{lang_code}_v{ver_num}_trajectories.csv') if trajectory_columns[0] in columns else None,
+        'failed_intervals': 0,
+        'processed_intervals': 0,
+        'spool': None,
+        'speaker_configs': {},
+        'fingerprints': None,
+        'quota': None,
+        'pending_batches': 0, # batches in flight
+        'scheduling': True, # some TextGrids are not in a batch yet
+    }
 
-    results = []
-    total_failed_intervals = 0
-    total_processed_intervals = 0
+    tg_files = [tg_file.name for tg_file in os.scandir(tg_dir) if tg_file.is_file() and tg_file.name.endswith('.TextGrid')]
 
-    # Using ProcessPoolExecutor for parallel processing
-    max_workers = min(10, os.cpu_count() or 1)  # Adapt according to your CPU
-    with ProcessPoolExecutor(max_workers=max_workers) as executor:
-        futures = {
-            executor.submit(process_textgrid_file, lang_code, tg_file.name, tg_dir, snd_dir): tg_file.name
-            for tg_file in os.scandir(tg_dir) if tg_file.is_file() and tg_file.name.endswith('.TextGrid')
+    # Results are streamed to shards in the checkpoint directory, or in a temporary directory if no checkpoint is kept
+    if checkpoint_dir:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        check_checkpoint_settings(checkpoint_dir, columns, options)
+        job['shard_dir'] = checkpoint_dir
+    else:
+        job['spool'] = tempfile.TemporaryDirectory(prefix=f'.{lang_code}_v{ver_num}_', dir=output_dir)
+        job['shard_dir'] = job['spool'].name
+
+    # With a previous version, the rows of the recordings whose TextGrid and mp3 did not change are copied from its output
+    if previous_ver or save_sources:
+        job['fingerprints'] = fingerprint_files(tg_files, tg_dir, job['snd_dir'])
+        job['signature'] = options_signature(options)
+    if previous_ver:
+        previous = load_sources(sources_path(output_dir, lang_code, previous_ver), job['signature'])
+        if previous is not None:
+            finished, _ = load_manifest(job['shard_dir'])
+            reused = {os.path.splitext(tg_file)[0]: (tg_file, *previous[tg_file][2:]) for tg_file in tg_files
+                      if tg_file not in finished and tg_file in previous and previous[tg_file][:2] == list(job['fingerprints'][tg_file])}
+            if reused:
+                previous_base = os.path.join(output_dir, f'{lang_code}_v{previous_ver}')
+                nullable_columns = nullable_result_columns(columns)
+                reuse_previous_rows(job['shard_dir'], reused, previous_base + '_dur_f0_formants.csv',
+                                    job['trajectory_csv'] and previous_base + '_trajectories.csv', nullable_columns, max_buffered_rows)
+            logging.info(f"Reusing {len(reused)} unchanged recordings of {lang_code}_v{previous_ver} for {lang_code}_v{ver_num}, "
+                         f"{len(tg_files) - len(reused) - len(finished)} new or changed recordings left.")
+
+    # Skip the TextGrids that an earlier run already finished, or quarantined
+    finished, _ = load_manifest(job['shard_dir'])
+    for failed_intervals, processed_intervals in finished.values():
+        job['failed_intervals'] += failed_intervals
+        job['processed_intervals'] += processed_intervals
+    job['tg_files'] = [tg_file for tg_file in tg_files if tg_file not in finished]
+    quarantine_path = os.path.join(output_dir, f'{lang_code}_v{ver_num}_quarantine.tsv')
+    if os.path.exists(quarantine_path):
+        if checkpoint_dir:
+            quarantined = set(pd.read_csv(quarantine_path, sep='\t', dtype=str, keep_default_na=False)['file'])
+            job['tg_files'] = [tg_file for tg_file in job['tg_files'] if tg_file not in quarantined]
+        else:
+            os.remove(quarantine_path)
+    if finished and checkpoint_dir:
+        logging.info(f"Resuming {lang_code}_v{ver_num} from {checkpoint_dir}: {len(finished)} TextGrids already done, {len(job['tg_files'])} left.")
+
+    job['writer'] = ShardWriter(job['shard_dir'], shard_size=shard_size, max_rows=max_buffered_rows, columns=columns)
+
+    # Per-file stage timings are written as JSON lines, and a summary as JSON, next to the output CSV
+    job['timings'] = None
+    if timings:
+        timings_base = os.path.join(output_dir, f'{lang_code}_v{ver_num}_timings')
+        job['timings'] = {
+            'files': 0,
+            'total': dict.fromkeys(timing_stages, 0.0),
+            'max': dict.fromkeys(timing_stages, 0.0),
+            'summary_path': timings_base + '.json',
+            'log': open(timings_base + '.jsonl', 'a' if checkpoint_dir else 'w', encoding='utf-8'), # a resumed run adds to the log
         }
+    return job
 
-        for future in as_completed(futures):
-            try:
-                res, failed_intervals, processed_intervals = future.result()
-                if res:
-                    results.extend(res)
-                total_failed_intervals += failed_intervals
-                total_processed_intervals += processed_intervals
-            except Exception as e:
-                logging.error(f"Error in future result: {e}")
+# Helper function to record the result of one TextGrid of a language
+def record_file(job, tg_file, res, failed_intervals, processed_intervals, file_timings):
+    job['writer'].add(tg_file, res, failed_intervals, processed_intervals)
+    job['failed_intervals'] += failed_intervals
+    job['processed_intervals'] += processed_intervals
+    if job['quota']:
+        count_quota(job['quota'], os.path.splitext(tg_file)[0], batch_column(res, job['writer'].columns, 'seg'))
+
+    timings = job['timings']
+    if timings:
+        timings['files'] += 1
+        for stage, seconds in file_timings.items():
+            timings['total'][stage] += seconds
+            timings['max'][stage] = max(timings['max'][stage], seconds)
+        record = {'file': tg_file, 'processed_intervals': processed_intervals, 'failed_intervals': failed_intervals}
+        record.update({stage: round(seconds, 6) for stage, seconds in file_timings.items()})
+        timings['log'].write(json.dumps(record) + '\n')
 
+# Helper function to read the speaker of every recording of a language from the speaker TSVs used by filter_csv.py
+# Returns a dict from file_id to speaker_id, or None if the language has no speaker file
+def read_speaker_info(speaker_info_dir, lang_code):
+    speaker_info_files = sorted(f for f in os.listdir(speaker_info_dir) if f.startswith(lang_code) and f.endswith('.tsv'))
+    if not speaker_info_files:
+        return None
+    speaker_info_df = pd.read_csv(os.path.join(speaker_info_dir, speaker_info_files[0]), sep='\t', usecols=['path', 'speaker_id'],
+                                  dtype=str, keep_default_na=False, low_memory=False)
+    file_ids = speaker_info_df['path'].str.replace('.mp3', '', regex=False)
+    return dict(zip(file_ids, speaker_info_df['speaker_id']))
+
+# Helper function to choose a formant configuration per speaker for every language, before the extraction
+# Speakers with at least min_files recordings are evaluated on a sample of sample_files of them, one task per speaker on the shared
+# pool of workers; the recordings of the other speakers keep the choice by mean F0
+# The choices are saved to {lang_code}_v{ver_num}_speaker_ceilings.csv and kept in job['speaker_configs'] by TextGrid
+def optimise_speaker_configs(executor, jobs, options, speaker_info_dir, ceiling_grid, sample_files, min_files, output_dir, max_in_flight):
+    work_items = []
+    speakers = {}
+    for job in jobs:
+        speaker_of_file = read_speaker_info(speaker_info_dir, job['lang_code'])
+        if speaker_of_file is None:
+            logging.warning(f"No speaker file for {job['lang_code']} in {speaker_info_dir}. Keeping the formant settings by mean F0.")
+            continue
+
+        # All TextGrids of the language are grouped by speaker, so that a resumed run samples the same recordings
+        files_by_speaker = {}
+        for tg_file in sorted(f for f in os.listdir(job['tg_dir']) if f.endswith('.TextGrid')):
+            speaker_id = speaker_of_file.get(os.path.splitext(tg_file)[0])
+            if speaker_id:
+                files_by_speaker.setdefault(speaker_id, []).append(tg_file)
+        job['speaker_ceilings'] = []
+        for speaker_id, tg_files in files_by_speaker.items():
+            if len(tg_files) >= min_files:
+                sample = sorted(random.Random(speaker_id).sample(tg_files, min(sample_files, len(tg_files))))
+                work_items.append((job['lang_code'], sample, job['tg_dir'], job['snd_dir'], options, ceiling_grid))
+                speakers[(job['tg_dir'], sample[0])] = (job, speaker_id, tg_files)
+
+    for item, future in bounded_map(executor, choose_speaker_config, work_items, max_in_flight):
+        job, speaker_id, tg_files = speakers[(item[2], item[1][0])]
+        try:
+            config, n_vowels = future.result()
+        except Exception as e:
+            logging.error(f"Error choosing the formant settings of speaker {speaker_id}: {e}")
+            continue
+        if config is not None:
+            job['speaker_configs'].update(dict.fromkeys(tg_files, config))
+            job['speaker_ceilings'].append((speaker_id, len(tg_files), len(item[1]), n_vowels, *config))
+
+    for job in jobs:
+        if 'speaker_ceilings' in job:
+            ceilings_csv = os.path.join(output_dir, f"{job['lang_code']}_v{job['ver_num']}_speaker_ceilings.csv")
+            pd.DataFrame(sorted(job['speaker_ceilings']), columns=['speaker_id', 'n_files', 'n_sampled_files', 'n_vowels', 'maximum_formant',
+                                                                   'number_of_formants', 'window_length']).to_csv(ceilings_csv, index=False)
+            print(f"Formant settings of {len(job['speaker_ceilings'])} speakers saved to {ceilings_csv}")
+
+# Helper function to set up the speaker quotas of a language: every speaker needs quota times headroom rows of each of the vowels
+# The TextGrids are put in an order that takes one recording of every speaker in turn; those without a known speaker are left out,
+# since filter_csv.py drops their rows. The vowels that a resumed run already has in its shards count towards the quotas
+def start_quota(job, speaker_of_file, quota, vowels, headroom):
+    files_by_speaker = {}
+    for tg_file in sorted(job['tg_files']):
+        speaker_id = speaker_of_file.get(os.path.splitext(tg_file)[0])
+        if speaker_id:
+            files_by_speaker.setdefault(speaker_id, []).append(tg_file)
+    n_files = len(job['tg_files'])
+    job['tg_files'] = [tg_file for turn in zip_longest(*files_by_speaker.values()) for tg_file in turn if tg_file]
+    job['quota'] = {'speaker_of_file': speaker_of_file, 'vowels': vowels, 'target': math.ceil(quota * headroom), 'counts': {},
+                    'met': set(), 'skipped': 0, 'unknown': n_files - len(job['tg_files'])}
+
+    _, shards = load_manifest(job['shard_dir'])
+    for shard in shards:
+        rows = read_shard(os.path.join(job['shard_dir'], shard), usecols=['file_id', 'seg'])
+        for file_id, segs in rows.groupby('file_id')['seg']:
+            count_quota(job['quota'], file_id, segs)
+    job['quota']['speakers'] = len(set(files_by_speaker) | set(job['quota']['counts']))
+
+# Helper function to count the quota vowels among the segment labels of the rows of a recording
+def count_quota(quota, file_id, segs):
+    speaker_id = quota['speaker_of_file'].get(file_id)
+    if speaker_id is None:
+        return
+    counts = quota['counts'].setdefault(speaker_id, dict.fromkeys(quota['vowels'], 0))
+    for seg in segs:
+        if seg in counts:
+            counts[seg] += 1
+    if all(n >= quota['target'] for n in counts.values()):
+        quota['met'].add(speaker_id)
+
+# Helper function to get the batches of TextGrids of a language; with speaker quotas, a batch is filled (when it is needed) with the
+# next TextGrids of the speakers whose quotas are not met yet
+def job_batches(job, batch_size):
+    quota = job['quota']
+    if quota is None:
+        for i in range(0, len(job['tg_files']), batch_size):
+            yield job['tg_files'][i:i + batch_size]
+        return
+
+    batch = []
+    for tg_file in job['tg_files']:
+        if quota['speaker_of_file'][os.path.splitext(tg_file)[0]] in quota['met']:
+            quota['skipped'] += 1
+            continue
+        batch.append(tg_file)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+    logging.info(f"{job['lang_code']}_v{job['ver_num']}: skipped {quota['skipped']} recordings of speakers whose quotas were met "
+                 f"(quotas met for {len(quota['met'])} of {quota['speakers']} speakers so far) and {quota['unknown']} recordings "
+                 f"without a known speaker.")
+
+# Helper function to generate the batches of all languages, one language after the other
+# Every job counts its batches in flight; a language whose batches are all out is written here if none is in flight any more, and
+# otherwise when its last batch is done
+def schedule_batches(jobs, batch_size, options, nullable_columns, merger):
+    for job in jobs:
+        for tg_files in job_batches(job, batch_size):
+            job['pending_batches'] += 1
+            yield (job['lang_code'], tg_files, job['tg_dir'], job['snd_dir'], options,
+                   {tg_file: job['speaker_configs'][tg_file] for tg_file in tg_files if tg_file in job['speaker_configs']})
+        job['scheduling'] = False
+        if not job['pending_batches']:
+            finish_language(job, nullable_columns, merger)
+
+# Helper function to write the CSV of a language whose TextGrids are all done
+# The shards are merged on the merger thread (the future is kept as the job's 'merge'), so that the workers are kept busy with the
+# batches of the other languages in the meantime
+def finish_language(job, nullable_columns, merger):
+    job['writer'].flush()
+    job['merge'] = merger.submit(merge_language, job, nullable_columns)
+
+# Helper function to merge the shards of a finished language into its CSV, and write its sources, timings and counts
+def merge_language(job, nullable_columns):
     # Save results to CSV
-    df = pd.DataFrame(results, columns=['lang_code', 'file_id', 'mean_pitch_range', 'prev_seg', 'seg', 'seg_intv', 'next_seg', 'preceded_by_cons', 'followed_by_cons', 'seg_start', 'seg_stop', 'seg_dur', 'F0_mid10', 'F0_first10', 'F0_seg_mean', 'F1', 'F2',
-                                    'word', 'word_start', 'word_stop', 'word_dur', 'utt_dur', 'n_phone', 'utt_perc', 'utt_pos'])
-    if not df.empty:
-        df.to_csv(output_csv, index=False, na_rep='NaN')
-        print(f"Results saved to {output_csv}")
+    finished, shards = load_manifest(job['shard_dir'])
+    n_rows = 0
+    if shards:
+        n_rows = merge_shards([os.path.join(job['shard_dir'], shard) for shard in shards], job['output_csv'], nullable_columns,
+                              job['trajectory_csv'])
+    if n_rows:
+        print(f"Results saved to {job['output_csv']}")
+        if job['trajectory_csv']:
+            print(f"Trajectories saved to {job['trajectory_csv']}")
     else:
-        print("No valid results to save")
+        print(f"No valid results to save for {job['lang_code']}_v{job['ver_num']}")
+    # Save the fingerprints and interval counts of the finished recordings, for the incremental extraction of the next version
+    if job['fingerprints'] is not None:
+        sources = {tg_file: [*fingerprints, *finished[tg_file]] for tg_file, fingerprints in job['fingerprints'].items() if tg_file in finished}
+        with open(sources_path(os.path.dirname(job['output_csv']), job['lang_code'], job['ver_num']), 'w', encoding='utf-8') as f:
+            json.dump({'options': job['signature'], 'files': sources}, f)
+    if job['spool']:
+        job['spool'].cleanup()
+
+    if job['timings']:
+        job['timings']['log'].close()
+        with open(job['timings']['summary_path'], 'w', encoding='utf-8') as f:
+            json.dump(summarise_timings(job), f, indent=2)
+        print(f"Timings saved to {job['timings']['summary_path']}")
 
     # Report the number of processed and failed intervals
-    print(f"Number of vowel intervals successfully processed: {total_processed_intervals}")
-    print(f"Number of vowel intervals that failed to yield an F0 value: {total_failed_intervals}")
+    print(f"Number of vowel intervals successfully processed: {job['processed_intervals']}")
+    print(f"Number of vowel intervals that failed to yield an F0 value: {job['failed_intervals']}")
+
+# Helper function to set up the work queue of one language in the shared queue directory
+def start_queue(commonvoice_dir, lang_code, ver_num, output_dir, queue_dir, batch_size, columns, lease_seconds):
+    # Define paths
+    lang_dir = os.path.join(commonvoice_dir, f'{lang_code}_v{ver_num}')
+    tg_dir = os.path.join(lang_dir, 'output')
+    job = {
+        'lang_code': lang_code,
+        'ver_num': ver_num,
+        'tg_dir': tg_dir,
+        'snd_dir': os.path.join(lang_dir, 'validated'),
+        'output_csv': os.path.join(output_dir, f'{lang_code}_v{ver_num}_dur_f0_formants.csv'),
+        'trajectory_csv': os.path.join(output_dir, f'{lang_code}_v{ver_num}_trajectories.csv') if trajectory_columns[0] in columns else None,
+        'merged': False,
+        'given_up': False, # only batches that failed on this node are left
+    }
+    tg_files = [tg_file.name for tg_file in os.scandir(tg_dir) if tg_file.is_file() and tg_file.name.endswith('.TextGrid')]
+    job['queue'] = WorkQueue(os.path.join(queue_dir, f'{lang_code}_v{ver_num}'), tg_files, batch_size, columns, lease_seconds)
+    return job
+
+# Helper function to process the batches of the work queues together with the other nodes, until all of them are done
+# A batch is only claimed when a worker is free, so that the other nodes get their share. When the batches left are all leased by
+# other nodes, this node waits for them to be finished, or takes them over once their leases expire. The node that finds all
+# batches of a language done writes its CSV
+# A batch that fails is left in the queue: this node does not claim it again, and gives up on a language once only such batches are
+# left. Once the pool of workers is broken, this node claims no more batches and stops, and the other nodes (or a rerun) finish
+# the queue
+def run_queues(executor, jobs, options, max_in_flight, controller, nullable_columns):
+    jobs_by_dir = {job['tg_dir']: job for job in jobs}
+    broken = False
+    while True:
+        batches = ((job['lang_code'], tg_files, job['tg_dir'], job['snd_dir'], options)
+                   for job in jobs for _, tg_files in job['queue'].claim_batches(lambda: broken))
+        for batch, future in bounded_map(executor, process_textgrid_batch_monitored, batches, max_in_flight):
+            queue = jobs_by_dir[batch[2]]['queue']
+            batch_num = queue.batch_nums[batch[1][0]]
+            column_batches, finished_files = [], []
+            try:
+                batch_results, worker_pid, worker_rss = future.result()
+                if controller:
+                    controller.record(len(batch_results[1]), worker_pid, worker_rss)
+                for tg_file, res, failed_intervals, processed_intervals, _ in split_batch(batch_results):
+                    column_batches.append(res)
+                    finished_files.append((tg_file, failed_intervals, processed_intervals))
+            except Exception as e:
+                logging.error(f"Error in future result for {len(batch[1])} TextGrids starting with {batch[1][0]}: {e}")
+                broken = broken or isinstance(e, BrokenProcessPool)
+                queue.release(batch_num, failed=True)
+            else:
+                queue.complete(batch_num, column_batches, finished_files)
+            for job in jobs:
+                job['queue'].renew()
+
+        if broken:
+            logging.error("The process pool is broken; the batches left are kept in the queue for the other nodes or a rerun.")
+            return
+
+        waiting = False
+        for job in jobs:
+            if job['merged'] or job['given_up']:
+                continue
+            if not job['queue'].finished():
+                if job['queue'].stuck():
+                    logging.error(f"The batches left of {job['lang_code']}_v{job['ver_num']} failed on this node; they are kept in the "
+                                  f"queue for the other nodes or a rerun.")
+                    job['given_up'] = True
+                else:
+                    waiting = True
+                continue
+            job['merged'] = True
+            merged = job['queue'].merge(job['output_csv'], nullable_columns, job['trajectory_csv'])
+            if merged is None:
+                print(f"The results of {job['lang_code']}_v{job['ver_num']} are merged by another node, or were merged before")
+                continue
+            n_rows, failed_intervals, processed_intervals = merged
+            if n_rows:
+                print(f"Results saved to {job['output_csv']}")
+                if job['trajectory_csv']:
+                    print(f"Trajectories saved to {job['trajectory_csv']}")
+            else:
+                print(f"No valid results to save for {job['lang_code']}_v{job['ver_num']}")
+            print(f"Number of vowel intervals successfully processed: {processed_intervals}")
+            print(f"Number of vowel intervals that failed to yield an F0 value: {failed_intervals}")
+        if not waiting:
+            return
+        time.sleep(min(60.0, jobs[0]['queue'].lease_seconds / 4))
+
+def main(commonvoice_dir, lang_code, ver_num, output_dir, checkpoint_dir=None, shard_size=1000, max_buffered_rows=50000, batch_size=20,
+         audio_cache_dir=None, audio_cache_gb=50.0, formant_sweep=None, timings=False,
+         vowel_regions_only=False, region_padding=0.1, keep_vowels=None, min_seg_dur=0, min_utt_dur=0,
+         max_workers=None, adaptive_workers=False, adapt_interval=30.0, memory_limit_gb=None, trajectories=False, extra_measures=False,
+         track_store_dir=None, speaker_info_dir=None, ceiling_grid=default_ceiling_grid, ceiling_sample_files=10, ceiling_min_files=20,
+         queue_dir=None, lease_seconds=600.0, previous_ver=None, save_sources=False, file_timeout=None, max_tasks_per_worker=None,
+         speaker_quota=None, quota_speaker_dir=None, quota_vowels=('a', 'i', 'u'), quota_headroom=1.5):
+    # Record the start time
+    start_time = time.time()
+
+    # Output columns of this run
+    columns = result_columns(formant_sweep, trajectories, extra_measures)
+    nullable_columns = nullable_result_columns(columns)
+    options = {'formant_configs': formant_sweep, 'vowel_regions_only': vowel_regions_only, 'region_padding': region_padding,
+               'trajectories': trajectories}
+    if extra_measures:
+        options['extra_measures'] = True
+
+    # Thresholds of the later filtering that can already be checked on the TextGrids, to skip recordings without decoding them
+    if keep_vowels is not None or min_seg_dur or min_utt_dur:
+        options['segment_filter'] = {'vowels': keep_vowels, 'min_seg_dur': min_seg_dur, 'min_utt_dur': min_utt_dur}
+
+    # With a queue directory, this invocation is one of several nodes sharing the work through the queues of the languages
+    queue_jobs = []
+    if queue_dir:
+        languages = find_languages(commonvoice_dir, ver_num) if lang_code == 'all' else [(lang_code, ver_num)]
+        queue_jobs = [start_queue(commonvoice_dir, lang, ver, output_dir, queue_dir, batch_size, columns, lease_seconds)
+                      for lang, ver in languages]
+        jobs = []
+    # With lang_code 'all', every language in the CommonVoice directory is processed with one shared pool of workers
+    elif lang_code == 'all':
+        languages = find_languages(commonvoice_dir, ver_num)
+        jobs = [start_language(commonvoice_dir, lang, ver, output_dir, checkpoint_dir and os.path.join(checkpoint_dir, f'{lang}_v{ver}'),
+                               shard_size, max_buffered_rows, columns, timings, options, previous_ver, save_sources)
+                for lang, ver in languages]
+    else:
+        jobs = [start_language(commonvoice_dir, lang_code, ver_num, output_dir, checkpoint_dir, shard_size, max_buffered_rows, columns, timings,
+                               options, previous_ver, save_sources)]
+
+    # With speaker quotas, the recordings of every language are processed in turns by speaker, until the quotas of the speaker are met
+    if speaker_quota:
+        for job in jobs:
+            speaker_of_file = read_speaker_info(quota_speaker_dir, job['lang_code'])
+            if speaker_of_file is None:
+                logging.warning(f"No speaker file for {job['lang_code']} in {quota_speaker_dir}. Processing all recordings.")
+            else:
+                start_quota(job, speaker_of_file, speaker_quota, quota_vowels, quota_headroom)
+
+    # The largest languages are scheduled first, so that the small ones fill up the workers at the end of the run
+    jobs.sort(key=lambda job: len(job['tg_files']), reverse=True)
+    jobs_by_dir = {job['tg_dir']: job for job in jobs}
+
+    # Using ProcessPoolExecutor for parallel processing
+    # The TextGrids are sent to the workers in batches, and only a few batches per worker are submitted at a time
+    # In adaptive mode, the number of batches in flight (and so of busy workers) follows the throughput and memory use
+    max_workers = max_workers or min(10, os.cpu_count() or 1)
+    max_in_flight = 2 * max_workers
+    controller = None
+    if adaptive_workers:
+        if memory_limit_gb:
+            memory_limit = memory_limit_gb * 1024 ** 3
+        else:
+            memory_limit = 0.8 * os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+        controller = ConcurrencyController(max_workers, memory_limit, adapt_interval)
+        max_in_flight = controller
+    # (the generator runs after the per-speaker formant settings are chosen)
+    # The CSVs of the finished languages are merged on a thread of their own, one at a time
+    merger = ThreadPoolExecutor(max_workers=1)
+    batches = schedule_batches(jobs, batch_size, options, nullable_columns, merger)
+    if audio_cache_dir:
+        os.makedirs(audio_cache_dir, exist_ok=True)
+    audio_cache_budget = audio_cache_gb * 1024 ** 3
+    pool_args = {'max_workers': max_workers, 'initializer': init_worker, 'initargs': (audio_cache_dir, audio_cache_budget, track_store_dir)}
+    if file_timeout or max_tasks_per_worker or adaptive_workers:
+        executor = SupervisedPool(output_dir, file_timeout, max_tasks_per_worker, **pool_args)
+        if controller:
+            controller.pool = executor
+    else:
+        executor = ProcessPoolExecutor(**pool_args)
+    with executor:
+        if queue_jobs:
+            run_queues(executor, queue_jobs, options, max_in_flight, controller, nullable_columns)
+        if speaker_info_dir:
+            optimise_speaker_configs(executor, jobs, options, speaker_info_dir, ceiling_grid, ceiling_sample_files, ceiling_min_files,
+                                     output_dir, 2 * max_workers)
+        for batch, future in bounded_map(executor, process_textgrid_batch_monitored, batches, max_in_flight):
+            job = jobs_by_dir[batch[2]]
+            try:
+                batch_results, worker_pid, worker_rss = future.result()
+                if controller:
+                    controller.record(len(batch_results[1]), worker_pid, worker_rss)
+                for tg_file, res, failed_intervals, processed_intervals, file_timings in split_batch(batch_results):
+                    record_file(job, tg_file, res, failed_intervals, processed_intervals, file_timings)
+            except Exception as e:
+                logging.error(f"Error in future result for {len(batch[1])} TextGrids starting with {batch[1][0]}: {e}")
+
+            # Write the output of a language as soon as all its TextGrids are done
+            job['pending_batches'] -= 1
+            if not job['pending_batches'] and not job['scheduling']:
+                finish_language(job, nullable_columns, merger)
+
+    # Wait for the CSVs that are still being merged
+    merger.shutdown()
+    for job in jobs:
+        job['merge'].result()
+
+    if audio_cache_dir:
+        evict_audio_cache(audio_cache_dir, audio_cache_budget)
 
     # Record the end time
     end_time = time.time()
@@ -277,4 +2174,16 @@ def main(commonvoice_dir, lang_code, ver_num, output_dir):
 
 if __name__ == "__main__":
     args = parse_args()
-    main(args.commonvoice_dir, args.lang_code, args.ver_num, args.output_dir)
+    main(args.commonvoice_dir, args.lang_code, args.ver_num, args.output_dir,
+         checkpoint_dir=args.checkpoint_dir, shard_size=args.shard_size,
+         max_buffered_rows=args.max_buffered_rows, batch_size=args.batch_size,
+         audio_cache_dir=args.audio_cache_dir, audio_cache_gb=args.audio_cache_gb, formant_sweep=args.formant_sweep,
+         timings=args.timings, vowel_regions_only=args.vowel_regions_only, region_padding=args.region_padding,
+         keep_vowels=args.keep_vowels, min_seg_dur=args.min_seg_dur, min_utt_dur=args.min_utt_dur,
+         max_workers=args.max_workers, adaptive_workers=args.adaptive_workers, adapt_interval=args.adapt_interval,
+         memory_limit_gb=args.memory_limit_gb, trajectories=args.trajectories, extra_measures=args.extra_measures,
+         track_store_dir=args.track_store_dir, speaker_info_dir=args.speaker_info_dir, ceiling_grid=args.ceiling_grid,
+         ceiling_sample_files=args.ceiling_sample_files, ceiling_min_files=args.ceiling_min_files,
+         queue_dir=args.queue_dir, lease_seconds=args.lease_seconds, previous_ver=args.previous_ver, save_sources=args.save_sources,
+         file_timeout=args.file_timeout, max_tasks_per_worker=args.max_tasks_per_worker, speaker_quota=args.speaker_quota,
+         quota_speaker_dir=args.quota_speaker_dir, quota_vowels=args.quota_vowels, quota_headroom=args.quota_headroom)